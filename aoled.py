@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+from oled import OLEDCtrl
+
+
+class AsyncOLEDCtrl(OLEDCtrl):
+    """OLEDCtrl running on an asyncio event loop.
+
+    Scene init/draw/finish/key callbacks may be coroutine functions; plain
+    functions still work unchanged. Keys are polled by their own task and
+    a frame is drawn by a separate task, so a draw_func awaiting a slow
+    command does not stop key input or scene changes."""
+
+    # edge triggered input is waited for on an executor thread, which
+    # comes back at least this often so the loop can shut down
+    key_wait_max = 1.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wakeup = None
+        self._draw_task = None
+
+    def loop(self):
+        asyncio.run(self.loop_async())
+
+    async def loop_async(self):
+        self._wakeup = asyncio.Event()
+        key_task = asyncio.ensure_future(self.poll_keys_async())
+        # a failing key reader must not leave the loop asleep
+        key_task.add_done_callback(lambda task: self.wake())
+
+        try:
+            while not self.loop_break:
+                await self.wait_async()
+                self.current_time = time.monotonic()
+                self.perf.count('wakeups')
+
+                self.run_timers()
+                await self.update_async()
+
+                if self.flusher:
+                    self.flusher.check()
+
+                if self._draw_task and self._draw_task.done():
+                    # re-raise errors from the draw task
+                    task, self._draw_task = self._draw_task, None
+                    task.result()
+
+                if key_task.done():
+                    # the same for errors from reading keys
+                    key_task.result()
+
+                self.perf.maybe_dump(self.stats)
+        finally:
+            key_task.cancel()
+            self.cancel_draw()
+
+    def wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def wait_async(self):
+        # sleep until the next deadline or until something wakes us up,
+        # a display that is off only wakes up on key input
+        timeout = None
+        deadline = self.next_deadline(refresh=not self._draw_task)
+        if deadline is not None:
+            timeout = max(deadline - time.monotonic(), 0)
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def poll_keys_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.key_input.edge_triggered:
+                timeout = self.key_wait_max
+                deadline = self.key_queue.next_deadline()
+                if deadline is not None:
+                    timeout = min(max(deadline - time.monotonic(), 0),
+                                  timeout)
+                await loop.run_in_executor(None, self.key_input.wait, timeout)
+            else:
+                await asyncio.sleep(self.next_polling_interval())
+            self.current_time = time.monotonic()
+
+            if self.poll_keys():
+                self.wake()
+
+    async def update_async(self):
+        new_scene, events = self.take_pending()
+        await self.change_scene_async(new_scene)
+
+        for event in events:
+            if self.loop_break:
+                break
+            new_scene = await self.handle_key_event_async(event)
+            await self.change_scene_async(new_scene)
+
+        if self.current_time > self.display_off_time:
+            self.display_off()
+
+        elif (self.current_time > self.display_refresh_time
+              and not self._draw_task):
+            s = self.begin_frame()
+            self._draw_task = asyncio.ensure_future(self.draw_frame_async(s))
+
+    async def change_scene_async(self, new_scene):
+        if new_scene:
+            # the frame being drawn belongs to the old scene
+            self.cancel_draw()
+            action, new_scene = self.parse_scene_change(new_scene)
+
+            if action == 'pop':
+                await self.pop_scene_async()
+
+            elif action == 'push':
+                await self.push_scene_async(new_scene)
+
+            elif action == 'normal':
+                await self.set_scene_async(new_scene)
+
+            self._held_keys.clear()
+
+        self.check_loop_break()
+
+    async def handle_key_event_async(self, event):
+        action = self.key_event_action(event)
+        if action is None:
+            return None
+
+        self.key_handled(event)
+        if action == 'long':
+            return await self.scene.ahandle_long_key(event.key)
+        return await self.scene.ahandle_key(event.key)
+
+    async def draw_frame_async(self, s):
+        new_scene = await s.adraw(self)
+        self.end_frame(s, new_scene)
+        self.wake()
+
+    def cancel_draw(self):
+        if self._draw_task:
+            self._draw_task.cancel()
+            self._draw_task = None
+
+    async def set_scene_async(self, new_scene):
+        while self._scenes:
+            await self.pop_scene_async()
+        await self.push_scene_async(new_scene)
+
+    async def push_scene_async(self, new_scene):
+        self._scenes.append(new_scene)
+        await self.scene.ainit()
+        self.scene.run_post_cmds()
+
+    async def pop_scene_async(self):
+        await self.scene.afinish()
+        self.scene.run_post_cmds()
+        return self._scenes.pop()
@@ -0,0 +1,464 @@
+"""Bitmap fonts from BDF and PCF files.
+
+load_font() parses a font once, converts every glyph to page-major
+columns (the SSD1306 GDDRAM layout) and stores the result in a compact
+cache file under ~/.cache/oled/fonts. Later calls mmap that file and
+never parse the font again.
+
+Glyphs are grouped in pages of 256 code points. A page is only read
+from the map when one of its characters is first drawn, and a few
+recently used pages are kept decoded, so a large Unicode font costs
+memory for the characters on screen only.
+
+Fonts of any height (several pages per text line) and proportional
+fonts are supported. The result works as the `font` of OLEDCtrl.
+"""
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+from cache import LRUCache, cache_dir as default_cache_dir, write_file
+from fonts import INVERT, fallback_rows, text_blocks
+
+CACHE_MAGIC = b'OLEDFNT2'
+# magic, height, pages, ascent, width, code point pages, then offset
+# and advance of the glyph drawn for characters the font lacks
+_HEADER = struct.Struct('<8sHHhHIII')
+# the directory has a (code point page, block offset) pair per code
+# point page, a block a (data offset, advance) pair per code point;
+# all u32, so they can be cast
+_PAIR = struct.Struct('<II')
+# data offset of code points without a glyph
+MISSING = 0xffffffff
+
+PCF_MAGIC = b'\x01fcp'
+PCF_ACCELERATORS = 1 << 1
+PCF_METRICS = 1 << 2
+PCF_BITMAPS = 1 << 3
+PCF_BDF_ENCODINGS = 1 << 5
+PCF_BDF_ACCELERATORS = 1 << 8
+PCF_COMPRESSED_METRICS = 0x100
+
+# reverses the bits of a byte, for LSB first PCF bitmaps
+_REVERSE = bytes(int('{:08b}'.format(b)[::-1], 2) for b in range(256))
+
+# left is the x of the bitmap relative to the pen, ascent the height of
+# its top row above the baseline, rows are ints with the leftmost of the
+# `width` pixels as the highest bit
+Glyph = namedtuple('Glyph', 'advance left ascent rows width')
+
+
+def cache_path(path, cache_dir=None):
+    # keyed by path, size and mtime, so nothing has to read the font
+    st = os.stat(path)
+    key = '%s:%d:%d' % (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    name = os.path.basename(path).split('.')[0]
+    return os.path.join(cache_dir or default_cache_dir('fonts'),
+                        '%s-%s.fnt' % (name, digest))
+
+
+def load_font(path, cache_dir=None, fallback=None, page_cache=8):
+    """Load a BDF or PCF font, from its cache file if there is one.
+
+    Characters the font lacks are drawn from `fallback` if given, at
+    most `page_cache` code point pages are kept decoded."""
+    cache = cache_path(path, cache_dir)
+    try:
+        return BitmapFont.open(cache, fallback, page_cache)
+    except (OSError, ValueError):
+        pass
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+
+    if data[:4] == PCF_MAGIC:
+        compiled = compile_font(*parse_pcf(data))
+    else:
+        compiled = compile_font(*parse_bdf(data))
+
+    try:
+        write_file(cache, compiled)
+    except OSError:
+        # read-only cache dir, use the compiled font from memory
+        return BitmapFont(compiled, fallback, page_cache)
+
+    return BitmapFont.open(cache, fallback, page_cache)
+
+
+def parse_bdf(data):
+    """Return (ascent, descent, default code point, {code point: Glyph})."""
+    lines = iter(data.decode('latin-1').splitlines())
+    ascent = descent = default = None
+    fbb = (8, 8, 0, 0)
+    glyphs = {}
+
+    for line in lines:
+        words = line.split()
+        if not words:
+            continue
+        key = words[0]
+
+        if key == 'FONTBOUNDINGBOX':
+            fbb = tuple(int(w) for w in words[1:5])
+        elif key == 'FONT_ASCENT':
+            ascent = int(words[1])
+        elif key == 'FONT_DESCENT':
+            descent = int(words[1])
+        elif key == 'DEFAULT_CHAR':
+            default = int(words[1])
+
+        elif key == 'STARTCHAR':
+            code = advance = None
+            bbx = fbb
+            hex_rows = []
+            for line in lines:
+                words = line.split()
+                if not words:
+                    continue
+                if words[0] == 'ENCODING':
+                    code = int(words[1])
+                elif words[0] == 'DWIDTH':
+                    advance = int(words[1])
+                elif words[0] == 'BBX':
+                    bbx = tuple(int(w) for w in words[1:5])
+                elif words[0] == 'BITMAP':
+                    for line in lines:
+                        line = line.strip()
+                        if line == 'ENDCHAR':
+                            break
+                        hex_rows.append(line)
+                    break
+
+            if code is None or code < 0:
+                continue
+            w, h, xoff, yoff = bbx
+            rows = [int(r, 16) >> max(len(r) * 4 - w, 0) if r else 0
+                    for r in hex_rows[:h]]
+            if advance is None:
+                advance = fbb[0]
+            glyphs[code] = Glyph(advance, xoff, yoff + h, rows, w)
+
+    if ascent is None:
+        ascent = fbb[1] + fbb[3]
+    if descent is None:
+        descent = -fbb[3]
+    return ascent, descent, default, glyphs
+
+
+def parse_pcf(data):
+    """Return (ascent, descent, default code point, {code point: Glyph})."""
+    (count,) = struct.unpack_from('<I', data, 4)
+    tables = {}
+    for i in range(count):
+        kind, fmt, size, offset = struct.unpack_from('<IIII', data, 8 + 16 * i)
+        tables[kind] = offset
+
+    def table(kind):
+        # every table starts with its format, always little endian
+        offset = tables[kind]
+        (fmt,) = struct.unpack_from('<I', data, offset)
+        order = '>' if fmt & 4 else '<'
+        return fmt, order, offset + 4
+
+    fmt, order, pos = table(PCF_METRICS)
+    metrics = []
+    if fmt & PCF_COMPRESSED_METRICS:
+        (n,) = struct.unpack_from(order + 'H', data, pos)
+        pos += 2
+        for i in range(n):
+            metrics.append(tuple(b - 0x80 for b in data[pos:pos + 5]))
+            pos += 5
+    else:
+        (n,) = struct.unpack_from(order + 'I', data, pos)
+        pos += 4
+        for i in range(n):
+            metrics.append(struct.unpack_from(order + 'hhhhh', data, pos))
+            pos += 12
+
+    fmt, order, pos = table(PCF_BITMAPS)
+    (n,) = struct.unpack_from(order + 'I', data, pos)
+    pos += 4
+    offsets = struct.unpack_from(order + '%dI' % n, data, pos)
+    pos += 4 * n + 16
+    bitmaps = pos
+    pad = 1 << (fmt & 3)
+    msb_byte = bool(fmt & 4)
+    msb_bit = bool(fmt & 8)
+    unit = 1 << ((fmt >> 4) & 3)
+
+    fmt, order, pos = table(PCF_BDF_ENCODINGS)
+    min2, max2, min1, max1, default = struct.unpack_from(order + '5H',
+                                                         data, pos)
+    pos += 10
+    cols = max2 - min2 + 1
+    indices = struct.unpack_from(order + '%dH' % (cols * (max1 - min1 + 1)),
+                                 data, pos)
+
+    kind = PCF_BDF_ACCELERATORS
+    if kind not in tables:
+        kind = PCF_ACCELERATORS
+    fmt, order, pos = table(kind)
+    ascent, descent = struct.unpack_from(order + 'ii', data, pos + 8)
+
+    glyphs = {}
+    for i, idx in enumerate(indices):
+        if idx == 0xffff:
+            continue
+        code = (min1 + i // cols) * 256 + min2 + i % cols
+        left, right, advance, g_ascent, g_descent = metrics[idx]
+        w = right - left
+        h = g_ascent + g_descent
+        stride = -(-(-(-w // 8)) // pad) * pad
+
+        start = bitmaps + offsets[idx]
+        raw = bytes(data[start:start + stride * h])
+        if not msb_bit:
+            raw = raw.translate(_REVERSE)
+        if msb_byte != msb_bit and unit > 1:
+            raw = b''.join(raw[j:j + unit][::-1]
+                           for j in range(0, len(raw), unit))
+
+        rows = [int.from_bytes(raw[y * stride:(y + 1) * stride], 'big')
+                >> (stride * 8 - w) for y in range(h)]
+        glyphs[code] = Glyph(advance, left, g_ascent, rows, w)
+
+    if default not in glyphs:
+        default = None
+    return ascent, descent, default, glyphs
+
+
+def glyph_columns(glyph, ascent, pages):
+    """Page-major columns of a glyph: `pages` rows of `advance` bytes."""
+    advance = max(glyph.advance, 0)
+    top = ascent - glyph.ascent
+    out = bytearray(advance * pages)
+    for x in range(glyph.width):
+        cx = glyph.left + x
+        if not 0 <= cx < advance:
+            continue
+        bit = glyph.width - 1 - x
+        col = 0
+        for r, row in enumerate(glyph.rows):
+            y = top + r
+            if row >> bit & 1 and 0 <= y < pages * 8:
+                col |= 1 << y
+        for k in range(pages):
+            out[k * advance + cx] = (col >> (8 * k)) & 0xff
+    return bytes(out)
+
+
+def _box(advance, height, pages):
+    # outline of the cell, drawn for unknown characters
+    full = (1 << height) - 1
+    edge = 1 | 1 << (height - 1)
+    cols = [full] + [edge] * max(advance - 2, 0) + [full]
+    cols = cols[:advance]
+    return bytes((col >> (8 * k)) & 0xff for k in range(pages) for col in cols)
+
+
+def compile_font(ascent, descent, default, glyphs):
+    """Pack parsed glyphs into the cache file format."""
+    height = ascent + descent
+    pages = -(-height // 8)
+    advances = Counter(g.advance for g in glyphs.values() if g.advance > 0)
+    width = advances.most_common(1)[0][0] if advances else 8
+
+    blocks = {}
+    for code in glyphs:
+        if 0 <= code <= 0x10ffff:
+            blocks.setdefault(code >> 8, []).append(code)
+
+    start = _HEADER.size + len(blocks) * _PAIR.size
+    data_start = start + len(blocks) * 256 * _PAIR.size
+    directory = bytearray()
+    index = bytearray()
+    data = bytearray()
+
+    def add(glyph):
+        offset = data_start + len(data)
+        data.extend(glyph_columns(glyph, ascent, pages))
+        return offset
+
+    for block in sorted(blocks):
+        directory += _PAIR.pack(block, start + len(index))
+        entries = [(MISSING, 0)] * 256
+        for code in blocks[block]:
+            glyph = glyphs[code]
+            entries[code & 0xff] = (add(glyph), max(glyph.advance, 0))
+        for entry in entries:
+            index += _PAIR.pack(*entry)
+
+    if default in glyphs:
+        unknown = add(glyphs[default])
+        unknown_advance = max(glyphs[default].advance, 0)
+    else:
+        unknown = data_start + len(data)
+        unknown_advance = width
+        data += _box(width, min(height, pages * 8), pages)
+
+    header = _HEADER.pack(CACHE_MAGIC, height, pages, ascent, width,
+                          len(blocks), unknown, unknown_advance)
+    return bytes(header + directory + index + data)
+
+
+class _RowTable(dict):
+    # str.translate table for one page row of a font, filled by the
+    # font as characters are drawn and emptied as their code point
+    # pages leave its page cache
+
+    def __init__(self, font):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, code):
+        return self.font._fault(code, self)
+
+
+class BitmapFont(object):
+    """Font backed by a compiled cache file, usually mmap'd.
+
+    Like fonts.CompiledFont, a line is rasterized with str.translate,
+    once per page row of the font. Characters the font lacks come from
+    `fallback`, any font object, and are cut or padded to this font's
+    height."""
+
+    def __init__(self, buf, fallback=None, page_cache=8):
+        self._buf = buf
+        self.fallback = fallback
+        (magic, self.height, self.pages, self.ascent, self.width,
+         count, unknown, unknown_advance) = _HEADER.unpack_from(buf, 0)
+        if magic != CACHE_MAGIC:
+            raise ValueError('not a compiled font')
+
+        # checked before any view of buf exists, so open() can close it
+        start = _HEADER.size
+        end = start + count * _PAIR.size
+        if (end > len(buf)
+                or unknown + unknown_advance * self.pages > len(buf)
+                or any(offset + 256 * _PAIR.size > len(buf)
+                       for _, offset in _PAIR.iter_unpack(buf[start:end]))):
+            raise ValueError('truncated font cache')
+
+        directory = memoryview(buf)[start:end]
+        directory = directory.cast('I')
+        self._blocks = directory[0::2]
+        self._block_offsets = directory[1::2]
+
+        self._unknown = self._read_rows(unknown, unknown_advance)
+        # recently used code point pages
+        self.page_cache = LRUCache(page_cache, on_evict=self._evict)
+        self._tables = [_RowTable(self) for row in range(self.pages)]
+
+    @classmethod
+    def open(cls, path, fallback=None, page_cache=8):
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf, fallback, page_cache)
+        except (ValueError, TypeError, struct.error):
+            buf.close()
+            raise ValueError('bad font cache %s' % path)
+
+    def _read_rows(self, offset, advance):
+        raw = self._buf[offset:offset + advance * self.pages]
+        return tuple(raw[k * advance:(k + 1) * advance].decode('latin-1')
+                     for k in range(self.pages))
+
+    def _find(self, block):
+        blocks = self._blocks
+        i = bisect_left(blocks, block)
+        if i < len(blocks) and blocks[i] == block:
+            return self._block_offsets[i]
+        return None
+
+    def _page(self, block):
+        # (index offset, {code: rows}) of a code point page, only the
+        # glyphs drawn so far are read from the map
+        page = self.page_cache.get(block)
+        if page is None:
+            page = (self._find(block), {})
+            self.page_cache.put(block, page)
+        return page
+
+    def _rows(self, code):
+        start, glyphs = self._page(code >> 8)
+        rows = glyphs.get(code)
+        if rows is None:
+            offset = MISSING
+            if start is not None:
+                offset, advance = _PAIR.unpack_from(
+                    self._buf, start + (code & 0xff) * _PAIR.size)
+            if offset != MISSING:
+                rows = self._read_rows(offset, advance)
+            else:
+                rows = fallback_rows(self.fallback, chr(code), self.pages)
+                rows = tuple(rows) if rows else self._unknown
+            # kept with the page, so it goes when the page does
+            glyphs[code] = rows
+        return rows
+
+    def _fault(self, code, table):
+        rows = self._rows(code)
+        for row, t in zip(rows, self._tables):
+            t[code] = row
+        return table[code]
+
+    def _touch(self, text):
+        # a render uses its pages, so they are the last to be evicted
+        for block in text_blocks(text):
+            self._page(block)
+
+    def _evict(self, block, page):
+        glyphs = page[1]
+        for t in self._tables:
+            for code in glyphs:
+                t.pop(code, None)
+
+    def __contains__(self, c):
+        code = ord(c)
+        start = self._find(code >> 8)
+        if start is None:
+            return False
+        offset, _ = _PAIR.unpack_from(self._buf,
+                                      start + (code & 0xff) * _PAIR.size)
+        return offset != MISSING
+
+    def with_fallback(self, fallback):
+        return BitmapFont(self._buf, fallback, self.page_cache.maxsize)
+
+    def glyph(self, c):
+        # page-major columns: `pages` rows of advance bytes
+        return ''.join(self._rows(ord(c))).encode('latin-1')
+
+    def counters(self):
+        return self.page_cache.counters()
+
+    def text_width(self, text):
+        # every character translates to one latin-1 char per column
+        self._touch(text)
+        return len(text.translate(self._tables[0]))
+
+    def render(self, text, inverted=False):
+        self._touch(text)
+        raster = b''.join(text.translate(table).encode('latin-1')
+                          for table in self._tables)
+        if inverted:
+            raster = raster.translate(INVERT)
+        return raster
+
+    def render_line(self, text, width, inverted=False):
+        # exactly `width` columns per page row, cut or padded with blanks
+        self._touch(text)
+        raster = b''.join(
+            text.translate(table).encode('latin-1')[:width].ljust(width, b'\0')
+            for table in self._tables)
+        if inverted:
+            raster = raster.translate(INVERT)
+        return raster
@@ -0,0 +1,109 @@
+"""Benchmark for the row-major to page-major conversion in bitmap.py.
+
+Converts a random 128x64 1 bit frame with every implementation that is
+available here and prints one JSON document with microseconds per frame,
+e.g.
+
+    python bench/bitmap.py --loops 1000 --output before.json
+
+'naive' is a loop over every pixel, for reference; 'table' is the pure
+Python path, also timed when numpy is installed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bitmap
+from canvas import Canvas
+
+WIDTH = 128
+HEIGHT = 64
+
+
+def naive(rows, width, height):
+    stride = (width + 7) // 8
+    out = bytearray(width * ((height + 7) // 8))
+    for y in range(height):
+        for x in range(width):
+            if rows[y * stride + x // 8] >> (7 - x % 8) & 1:
+                out[(y // 8) * width + x] |= 1 << (y % 8)
+    return bytes(out)
+
+
+def timed(func, loops):
+    func()
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return (time.perf_counter() - start) / loops * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--loops', type=int, default=1000)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    stride = (WIDTH + 7) // 8
+    rows = bytes(random.randrange(256) for _ in range(stride * HEIGHT))
+    expected = naive(rows, WIDTH, HEIGHT)
+
+    cases = {}
+    cases['naive'] = (lambda: naive(rows, WIDTH, HEIGHT), 10)
+
+    np = bitmap.np
+
+    def table():
+        bitmap.np = None
+        try:
+            return bitmap.rows_to_pages(rows, WIDTH)
+        finally:
+            bitmap.np = np
+    cases['table'] = (table, args.loops)
+
+    buf = bytearray(len(expected))
+    canvas = Canvas(memoryview(buf), WIDTH, HEIGHT)
+    cases['canvas_load_rows'] = (lambda: canvas.load_rows(rows) or bytes(buf),
+                                 args.loops)
+
+    if np is not None:
+        cases['numpy_rows'] = (lambda: bitmap.rows_to_pages(rows, WIDTH),
+                               args.loops)
+        pixels = np.unpackbits(np.frombuffer(rows, np.uint8)).reshape(
+            HEIGHT, WIDTH)
+        cases['numpy_array'] = (lambda: bitmap.rows_to_pages(pixels),
+                                args.loops)
+
+    if bitmap.PILImage is not None:
+        image = bitmap.PILImage.frombytes('1', (WIDTH, HEIGHT), rows)
+        cases['pil'] = (lambda: bitmap.rows_to_pages(image), args.loops)
+
+    result = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': np.__version__ if np is not None else None,
+        'us_per_frame': {},
+    }
+    for name, (func, loops) in sorted(cases.items()):
+        if func() != expected:
+            raise AssertionError('%s gives a different frame' % name)
+        result['us_per_frame'][name] = round(timed(func, loops), 1)
+
+    out = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
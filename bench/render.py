@@ -0,0 +1,188 @@
+"""Frames-per-second benchmark for the OLEDCtrl render pipeline.
+
+Drives the scenes of progs/lite.py and progs/wifi.py through
+putline -> lines_to_buffer -> render_buffer -> bus against the in-memory
+panel from fakebus and prints one JSON document, e.g.
+
+    python bench/render.py --frames 500 --output before.json
+
+Compare two runs (e.g. two branches) by diffing their JSON output.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+from fakebus import FakeSSD1306Bus
+from progs import lite, wifi
+
+
+# canned command output, so scenes that shell out through utils get
+# realistic, deterministic text without touching the system
+def install_fixtures():
+    ips = ['lo               UNKNOWN        127.0.0.1/8',
+           'eth0             UP             192.168.10.23/24',
+           'wlan0            UP             10.42.0.117/24',
+           '']
+    conns = [{'name': 'office-5g-%02d long connection name' % i,
+              'uuid': '%08x-0000-0000-0000-000000000000' % i,
+              'up': int(i == 3)}
+             for i in range(40)]
+    aps = [{'in_use': 0, 'strength': 90 - i,
+            'ssid': 'neighbour access point %02d' % i}
+           for i in range(40)]
+
+    utils.get_ip_lines = lambda: list(ips)
+    utils.get_cpu_load = lambda: 0.42
+    utils.get_cpu_load_line = lambda: 'cpu load: 0.42'
+    utils.get_cpu_temp_line = lambda: 'cpu temp: 47.3c'
+    utils.get_mem_line = lambda: 'ram:  123/491MB'
+    utils.get_disk_line = lambda: 'disk: 3/15GB'
+    utils.get_saved_connections = lambda: [dict(c) for c in conns]
+    utils.get_wifi_aps = lambda: [dict(ap) for ap in aps]
+
+
+# scenario name -> (program, keys pressed from the initial scene)
+SCENARIOS = {
+    'lite-status': (lite, [1]),
+    'lite-menu': (lite, [3]),
+    'wifi-connections': (wifi, [2, 2, 2]),
+    'wifi-connections-deep': (wifi, [2] + [2] * 12),
+    'wifi-aps': (wifi, [2] + [2] * 41 + [1, 2, 2]),
+}
+
+
+def make_ctrl(prog, keys, ctrl_kwargs):
+    bus = FakeSSD1306Bus()
+    ctrl = prog.prepare_ctrl(bus=bus, **ctrl_kwargs)
+    ctrl.current_time = time.monotonic()
+    ctrl.init_display()
+    ctrl.extend_display_off_time(timeout=1e9)
+
+    for key in keys:
+        ctrl.pending_key = key
+        step(ctrl)
+
+    return ctrl, bus
+
+
+def step(ctrl):
+    # one loop iteration with the next frame due; the clock is simulated
+    # and moves one refresh interval a frame, so scrolling lines move as
+    # they would on the panel
+    ctrl.current_time += max(ctrl.scene.refresh_interval,
+                             ctrl.turbo_polling_interval)
+    ctrl.display_refresh_time = 0
+    ctrl.update()
+
+
+def run_frames(ctrl, frames):
+    for _ in range(frames):
+        step(ctrl)
+
+
+def measure_allocs(ctrl, frames):
+    # peak bytes allocated while rendering a frame, averaged over frames
+    tracemalloc.start()
+    total = 0
+    try:
+        for _ in range(frames):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            step(ctrl)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - current
+    finally:
+        tracemalloc.stop()
+    return total / frames
+
+
+def bench_scenario(name, frames, warmup, ctrl_kwargs):
+    prog, keys = SCENARIOS[name]
+    ctrl, bus = make_ctrl(prog, keys, ctrl_kwargs)
+
+    run_frames(ctrl, warmup)
+    bus.reset_counters()
+    ctrl.perf.reset()
+
+    gc_before = sum(s['collections'] for s in gc.get_stats())
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    run_frames(ctrl, frames)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    gc_runs = sum(s['collections'] for s in gc.get_stats()) - gc_before
+
+    counters = bus.counters()
+    latency = ctrl.stats()['latency']
+    alloc = measure_allocs(ctrl, min(frames, 100))
+
+    return {
+        'frames': frames,
+        'fps': frames / wall,
+        'wall_per_frame_us': wall / frames * 1e6,
+        'cpu_per_frame_us': cpu / frames * 1e6,
+        'alloc_peak_bytes_per_frame': alloc,
+        'gc_collections': gc_runs,
+        'bytes_per_frame': counters['bytes'] / frames,
+        'ioctls_per_frame': counters['ioctls'] / frames,
+        'stage_mean_us': {stage: h['mean'] * 1e6
+                          for stage, h in latency.items()
+                          if h['mean'] is not None},
+    }
+
+
+def git_rev():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                      cwd=ROOT, stderr=subprocess.DEVNULL)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenario', action='append',
+                        choices=sorted(SCENARIOS),
+                        help='run only this scenario (repeatable)')
+    parser.add_argument('--transfer-mode', default='auto',
+                        choices=['auto', 'rdwr', 'smbus'])
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    install_fixtures()
+    ctrl_kwargs = {'transfer_mode': args.transfer_mode}
+
+    result = {
+        'rev': git_rev(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'transfer_mode': args.transfer_mode,
+        'scenarios': {},
+    }
+    for name in args.scenario or sorted(SCENARIOS):
+        result['scenarios'][name] = bench_scenario(
+            name, args.frames, args.warmup, ctrl_kwargs)
+
+    out = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Row-major 1 bit pixels to SSD1306 page-major bytes.
+
+Images, charts and PIL drawings come as rows of pixels, eight to a
+byte with the leftmost pixel in the highest bit (PBM style). GDDRAM
+wants pages: for every 8 rows, one byte per column with the top row
+in bit 0. rows_to_pages() does that transposition with numpy when it
+is installed, and otherwise with one table lookup per row byte and
+int ops on whole 8x8 blocks.
+"""
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+# data holds ceil(height / 8) pages of `width` bytes, as Canvas.bitmap
+# takes them
+Image = namedtuple('Image', 'width height data')
+
+# _SPREAD[k][b]: the 8 pixels of row byte b as the bit k of 8 column
+# bytes, an 8x8 block is the OR of its 8 rows; built on first use
+_SPREAD = []
+
+
+def _spread_tables():
+    if not _SPREAD:
+        for k in range(8):
+            _SPREAD.append([
+                sum(1 << (8 * i + k) for i in range(8) if b >> (7 - i) & 1)
+                for b in range(256)])
+    return _SPREAD
+
+
+def _source(src, width, height):
+    # (packed rows, width, height) or (numpy pixels, width, height)
+    if PILImage is not None and isinstance(src, PILImage.Image):
+        if src.mode != '1':
+            src = src.convert('1')
+        # mode '1' packs like PBM, but with 1 for white, which is lit
+        return src.tobytes(), src.width, src.height
+
+    if np is not None and isinstance(src, np.ndarray):
+        if src.ndim != 2:
+            raise ValueError('expected a 2D array of pixels')
+        return src, src.shape[1], src.shape[0]
+
+    if width is None:
+        raise ValueError('width is needed for packed rows')
+    stride = (width + 7) // 8
+    if height is None:
+        height = len(src) // stride
+    if len(src) < stride * height:
+        raise ValueError('expected %d bytes of rows' % (stride * height))
+    return src, width, height
+
+
+def rows_to_pages(src, width=None, height=None, out=None):
+    """Convert pixels to page-major bytes, ceil(height / 8) pages of
+    `width` bytes.
+
+    src is PBM style packed rows (then width is needed, height defaults
+    to what the data holds), a 2D numpy array (nonzero is lit) or a PIL
+    image. The result is written to `out` if given, e.g. the canvas
+    buffer, and returned as bytes otherwise."""
+    src, width, height = _source(src, width, height)
+    return _convert(src, width, height, out)
+
+
+def to_image(src, width=None, height=None):
+    """rows_to_pages() as an Image, for Canvas.blit."""
+    src, width, height = _source(src, width, height)
+    return Image(width, height, _convert(src, width, height))
+
+
+def _convert(src, width, height, out=None):
+    page_num = (height + 7) // 8
+
+    if np is not None:
+        if isinstance(src, np.ndarray):
+            pixels = src != 0
+        else:
+            stride = (width + 7) // 8
+            rows = np.frombuffer(src, np.uint8, stride * height)
+            pixels = np.unpackbits(rows.reshape(height, stride), axis=1)
+            pixels = pixels[:, :width]
+        if height % 8:
+            pixels = np.vstack([pixels, np.zeros((page_num * 8 - height,
+                                                  width), pixels.dtype)])
+        # (page, row, column) -> (page, column, row), 8 rows to a byte
+        cols = pixels.reshape(page_num, 8, width).transpose(0, 2, 1)
+        pages = np.packbits(cols, axis=2, bitorder='little')
+        pages = pages.reshape(page_num * width)
+        if out is None:
+            return pages.tobytes()
+        np.frombuffer(out, np.uint8)[:] = pages
+        return out
+
+    result = _rows_to_pages(bytes(src), width, height, page_num)
+    if out is None:
+        return result
+    out[:] = result
+    return out
+
+
+def _rows_to_pages(src, width, height, page_num):
+    t0, t1, t2, t3, t4, t5, t6, t7 = _spread_tables()
+    stride = (width + 7) // 8
+    blank = bytes(stride)
+    out = []
+    for page in range(page_num):
+        rows = [src[y * stride:(y + 1) * stride] if y < height else blank
+                for y in range(page * 8, page * 8 + 8)]
+        # one 8x8 block per byte column: 8 lookups, 8 column bytes
+        blocks = b''.join(
+            (t0[a] | t1[b] | t2[c] | t3[d] | t4[e] | t5[f] | t6[g] | t7[h])
+            .to_bytes(8, 'little')
+            for a, b, c, d, e, f, g, h in zip(*rows))
+        out.append(blocks[:width])
+    return b''.join(out)
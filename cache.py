@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+
+
+def cache_dir(name):
+    # per-user directory for files derived from fonts, images and such
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'oled', name)
+
+
+def write_file(path, data):
+    # readers never see a half written file; raises OSError
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class LRUCache(object):
+    """Mapping of at most `maxsize` entries that evicts the least
+    recently used one, counting hits, misses and evictions.
+
+    on_evict(key, value) is called for every evicted entry."""
+
+    def __init__(self, maxsize=256, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            old = data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(*old)
+
+    def clear(self):
+        self._data.clear()
+
+    def counters(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
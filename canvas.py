@@ -0,0 +1,275 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitmap import rows_to_pages, to_image
+
+# colors
+BLACK = 0
+WHITE = 1
+INVERT = 2
+
+# translate tables by (op, arg), built on first use
+_tables = {}
+
+
+def _table(op, arg):
+    table = _tables.get((op, arg))
+    if table is None:
+        if op == 'or':
+            values = (b | arg for b in range(256))
+        elif op == 'and':
+            values = (b & arg for b in range(256))
+        elif op == 'xor':
+            values = (b ^ arg for b in range(256))
+        elif op == 'shl':
+            values = ((b << arg) & 0xff for b in range(256))
+        elif op == 'shr':
+            values = (b >> arg for b in range(256))
+        else:
+            raise ValueError('unknown op %r' % op)
+        table = _tables[(op, arg)] = bytes(values)
+    return table
+
+
+def _int(bs):
+    return int.from_bytes(bs, 'little')
+
+
+def _bytes(n, length):
+    return n.to_bytes(length, 'little')
+
+
+class Canvas(object):
+    """Pixel drawing on a page-major framebuffer.
+
+    The buffer is laid out like SSD1306 GDDRAM: `height` / 8 pages of
+    `width` column bytes, bit 0 being the top row of a page. Primitives
+    work on whole column runs of a page at once, through bytes.translate
+    tables or big-int bitwise ops, never pixel by pixel. Everything is
+    clipped to the canvas.
+
+    Colors are WHITE (set), BLACK (clear) and INVERT (xor)."""
+
+    def __init__(self, buffer, width, height):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.page_num = (height + 7) // 8
+        if np is not None:
+            self._array = np.frombuffer(buffer, np.uint8)
+
+    @property
+    def array(self):
+        # (pages, width) uint8 view of the buffer, for bulk operations
+        if np is None:
+            raise RuntimeError('numpy is not available')
+        return self._array.reshape(self.page_num, self.width)
+
+    def clear(self, color=BLACK):
+        fill = b'\xff' if color == WHITE else b'\x00'
+        self.buffer[:] = fill * len(self.buffer)
+
+    def _clip(self, x, w):
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width)
+        return x0, x1
+
+    def _mask_op(self, page, x0, x1, color, mask):
+        # apply a bit mask to the columns x0..x1 of a page
+        if color == WHITE:
+            table = _table('or', mask)
+        elif color == BLACK:
+            table = _table('and', ~mask & 0xff)
+        else:
+            table = _table('xor', mask)
+        start = page * self.width
+        seg = self.buffer[start + x0:start + x1]
+        seg[:] = bytes(seg).translate(table)
+
+    def pixel(self, x, y, color=WHITE):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        idx = (y >> 3) * self.width + x
+        bit = 1 << (y & 7)
+        if color == WHITE:
+            self.buffer[idx] |= bit
+        elif color == BLACK:
+            self.buffer[idx] &= ~bit & 0xff
+        else:
+            self.buffer[idx] ^= bit
+
+    def get_pixel(self, x, y):
+        # pixels outside the canvas are unlit
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        idx = (y >> 3) * self.width + x
+        return self.buffer[idx] >> (y & 7) & 1
+
+    def fill_rect(self, x, y, w, h, color=WHITE):
+        x0, x1 = self._clip(x, w)
+        y0 = max(y, 0)
+        y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        # one translate per page the box touches
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            top = max(y0, page * 8) - page * 8
+            bottom = min(y1, page * 8 + 8) - page * 8
+            mask = ((1 << (bottom - top)) - 1) << top
+            self._mask_op(page, x0, x1, color, mask)
+
+    def hline(self, x, y, w, color=WHITE):
+        self.fill_rect(x, y, w, 1, color)
+
+    def vline(self, x, y, h, color=WHITE):
+        self.fill_rect(x, y, 1, h, color)
+
+    def rect(self, x, y, w, h, color=WHITE):
+        if w <= 0 or h <= 0:
+            return
+        self.hline(x, y, w, color)
+        if h > 1:
+            self.hline(x, y + h - 1, w, color)
+        if h > 2:
+            self.vline(x, y + 1, h - 2, color)
+            if w > 1:
+                self.vline(x + w - 1, y + 1, h - 2, color)
+
+    def bitmap(self, x, y, data, w, h=None, mode='copy'):
+        """Draw a page-major bitmap `w` columns wide with its top left
+        corner at (x, y).
+
+        `data` holds ceil(h / 8) pages of `w` bytes, like the framebuffer.
+        mode is 'copy' (replace the pixels covered), 'or' (set the ones
+        set in the bitmap), 'clear' (clear them) or 'xor' (flip them)."""
+        src_pages = len(data) // w
+        if h is None:
+            h = src_pages * 8
+        src_pages = min(src_pages, (h + 7) // 8)
+
+        x0, x1 = self._clip(x, w)
+        if x0 >= x1 or src_pages <= 0:
+            return
+        sx = x0 - x
+        cols = x1 - x0
+
+        # rows of the last source page below h are not part of the bitmap
+        covers = [0xff] * src_pages
+        if h % 8:
+            covers[-1] = (1 << (h % 8)) - 1
+
+        shift = y & 7
+        first_page = y >> 3
+        srcs = []
+        for k in range(src_pages):
+            src = bytes(data[k * w + sx:k * w + sx + cols])
+            if covers[k] != 0xff:
+                src = src.translate(_table('and', covers[k]))
+            srcs.append(src)
+
+        for k in range(src_pages + (1 if shift else 0)):
+            page = first_page + k
+            if page < 0 or page >= self.page_num:
+                continue
+
+            # a destination page gets the lower part of source page k
+            # and the upper part of source page k - 1
+            part = 0
+            cover = 0
+            if k < src_pages:
+                part = _int(srcs[k].translate(_table('shl', shift)))
+                cover = (covers[k] << shift) & 0xff
+            if shift and k > 0:
+                part |= _int(srcs[k - 1].translate(_table('shr', 8 - shift)))
+                cover |= covers[k - 1] >> (8 - shift)
+
+            self._combine(page, x0, _bytes(part, cols), mode, cover)
+
+    def _combine(self, page, x0, part, mode, cover):
+        start = page * self.width + x0
+        end = start + len(part)
+
+        if np is not None:
+            dest = self._array[start:end]
+            src = np.frombuffer(part, np.uint8)
+            if mode == 'or':
+                dest |= src
+            elif mode == 'xor':
+                dest ^= src
+            elif mode == 'clear':
+                dest &= ~src
+            else:
+                dest &= ~cover & 0xff
+                dest |= src
+            return
+
+        seg = self.buffer[start:end]
+        dest = bytes(seg)
+        if mode == 'copy':
+            if cover != 0xff:
+                dest = dest.translate(_table('and', ~cover & 0xff))
+                seg[:] = _bytes(_int(dest) | _int(part), len(part))
+            else:
+                seg[:] = part
+            return
+
+        d = _int(dest)
+        p = _int(part)
+        if mode == 'or':
+            d |= p
+        elif mode == 'xor':
+            d ^= p
+        elif mode == 'clear':
+            d &= ~p
+        else:
+            raise ValueError('unknown mode %r' % mode)
+        seg[:] = _bytes(d, len(part))
+
+    def blit(self, x, y, image, mode='copy'):
+        # an images.Image, or anything with width, height and page data
+        self.bitmap(x, y, image.data, image.width, image.height, mode)
+
+    def paste(self, x, y, src, w=None, h=None, mode='copy'):
+        # row-major pixels: PBM style rows `w` wide, a numpy array or a
+        # PIL image, see bitmap.rows_to_pages
+        self.blit(x, y, to_image(src, w, h), mode)
+
+    def load_rows(self, src):
+        # replace the whole canvas with row-major pixels of its size,
+        # converted straight into the buffer
+        rows_to_pages(src, self.width, self.height, out=self.buffer)
+
+    def xor(self, x, y, data, w, h=None):
+        self.bitmap(x, y, data, w, h, mode='xor')
+
+    def hbar(self, x, y, w, h, fraction, color=WHITE):
+        # gauge: an outlined box filled from the left up to `fraction`
+        fraction = min(max(fraction, 0.0), 1.0)
+        self.rect(x, y, w, h, color)
+        fill = int(round((w - 2) * fraction))
+        if fill > 0:
+            self.fill_rect(x + 1, y + 1, fill, h - 2, color)
+
+    def graph(self, x, y, w, h, values, vmax=None, color=WHITE):
+        # one bar per value, the newest on the right, drawn as a single
+        # bitmap
+        values = list(values)[-w:]
+        if not values or h <= 0:
+            return
+        if vmax is None:
+            vmax = max(values) or 1
+
+        n = len(values)
+        pages = (h + 7) // 8
+        data = bytearray(pages * n)
+        for i, v in enumerate(values):
+            bar = int(round(min(max(v / vmax, 0.0), 1.0) * h))
+            bits = ((1 << bar) - 1) << (h - bar)
+            for k in range(pages):
+                data[k * n + i] = (bits >> (8 * k)) & 0xff
+
+        mode = {WHITE: 'or', BLACK: 'clear'}.get(color, 'xor')
+        self.bitmap(x + w - n, y, data, n, h, mode)
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+
+from canvas import Canvas, WHITE
+from scene import Scene
+
+
+class Region(object):
+    """A rectangle of the panel with its own buffer and schedule.
+
+    draw_func(state, region) draws into region.canvas, or with putline()
+    and text(), when the region is due: every `refresh_interval` seconds
+    if that is > 0, and whenever it was invalidated. Between those its
+    pixels are reused as they are. Regions with a higher z are drawn
+    over the ones below."""
+
+    def __init__(self, name, x, y, width, height, draw_func=None,
+                 refresh_interval=0, z=0, clear=True):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.refresh_interval = refresh_interval
+        self.z = z
+        self.clear = clear
+        self.visible = True
+        self._draw_func = draw_func
+
+        self.dirty = True
+        self.next_time = 0
+        # the display drawing the region, for its font
+        self.display = None
+
+        # page-major like the framebuffer, Canvas.blit takes the region
+        page_num = (height + 7) // 8
+        self.data = bytearray(width * page_num)
+        self.canvas = Canvas(memoryview(self.data), width, page_num * 8)
+
+    def invalidate(self):
+        self.dirty = True
+
+    def due(self, now):
+        if self.dirty:
+            return True
+        return self.refresh_interval > 0 and now >= self.next_time
+
+    def next_deadline(self):
+        if self.dirty:
+            return 0
+        if self.refresh_interval > 0:
+            return self.next_time
+        return None
+
+    def draw(self, state, display):
+        self.display = display
+        if self.clear:
+            self.canvas.clear()
+        if self._draw_func:
+            self._draw_func(state, self)
+        self.dirty = False
+        if self.refresh_interval > 0:
+            self.next_time = display.current_time + self.refresh_interval
+
+    def putline(self, line, row=0, inverted=False):
+        # a text line across the region, rows are font lines
+        font = self.display.font
+        raster = self.display.render_text(line, self.width, inverted)
+        self.canvas.bitmap(0, row * font.pages * 8, raster, self.width)
+
+    def text(self, x, y, text, inverted=False):
+        # text at a pixel position, cut at the right edge
+        width = min(self.display.font.text_width(text), self.width - x)
+        if width > 0:
+            raster = self.display.render_text(text, width, inverted)
+            self.canvas.bitmap(x, y, raster, width)
+
+
+class CompositorScene(Scene):
+    """Scene made of named regions, e.g. a status bar, a content area
+    and toast messages over them.
+
+    Every frame only the regions that are due are redrawn, then all of
+    them are merged into the framebuffer in z order and flushed; the
+    panel only gets the columns that changed. The scene's refresh
+    interval follows the next region due, so a clock ticking every
+    second does not redraw the content under it.
+
+    Region draw functions are plain functions, also on AsyncOLEDCtrl."""
+
+    # frame interval when no region is on a schedule
+    idle_interval = 1.0
+    # shortest frame interval
+    min_interval = 0.01
+
+    def __init__(self, regions=(), **kwargs):
+        # the controller must neither clear the buffer nor render lines
+        kwargs.update(clear=False, line_mode=False)
+        super().__init__(**kwargs)
+
+        # the display last drawn on, woken up by changes
+        self._display = None
+        self._toast = None
+        self._draw_func = self._compose
+
+        self.regions = OrderedDict()
+        for region in regions:
+            self.add_region(region)
+
+    def __getitem__(self, name):
+        return self.regions[name]
+
+    def add_region(self, region):
+        self.regions[region.name] = region
+        region.invalidate()
+        self._wake()
+        return region
+
+    def remove_region(self, name):
+        region = self.regions.pop(name, None)
+        self._wake()
+        return region
+
+    def invalidate(self, name=None):
+        """Redraw a region, or all of them, in the next frame."""
+        regions = [self.regions[name]] if name else self.regions.values()
+        for region in regions:
+            region.invalidate()
+        self._wake()
+
+    def toast(self, message, duration=2.0, z=100):
+        """Show a boxed message over everything else for `duration`
+        seconds."""
+        self.remove_region('toast')
+        self._toast = (message, duration, z)
+        self._wake()
+
+    def _wake(self):
+        # draw the next frame now
+        disp = self._display
+        if disp:
+            disp.display_refresh_time = 0
+            if hasattr(disp, 'wake'):
+                disp.wake()
+
+    def init(self, reset_frame=True):
+        for region in self.regions.values():
+            region.invalidate()
+        return super().init(reset_frame)
+
+    async def ainit(self, reset_frame=True):
+        for region in self.regions.values():
+            region.invalidate()
+        return await super().ainit(reset_frame)
+
+    def _show_toast(self, disp):
+        message, duration, z = self._toast
+        self._toast = None
+        font = disp.font
+        width = min(font.text_width(message) + 6, disp.width)
+        height = font.pages * 8 + 4
+
+        def draw_toast(state, region):
+            region.canvas.rect(0, 0, width, height, WHITE)
+            region.text(3, 2, message)
+
+        region = Region('toast', (disp.width - width) // 2,
+                        (disp.canvas.height - height) // 2, width, height,
+                        draw_toast, z=z)
+        region.expires = disp.current_time + duration
+        self.regions['toast'] = region
+
+    def _compose(self, state, disp):
+        self._display = disp
+        now = disp.current_time
+
+        if self._toast:
+            self._show_toast(disp)
+        toast = self.regions.get('toast')
+        if toast is not None and now >= toast.expires:
+            del self.regions['toast']
+
+        regions = sorted(self.regions.values(), key=lambda r: r.z)
+        for region in regions:
+            if region.visible and region.due(now):
+                region.draw(state, disp)
+
+        # merged from scratch, so a region going away leaves no trace;
+        # clear_buffer also ends a hardware scroll of an earlier scene
+        disp.clear_buffer()
+        for region in regions:
+            if region.visible:
+                disp.canvas.blit(region.x, region.y, region)
+
+        deadlines = [r.next_deadline() for r in regions if r.visible]
+        deadlines = [d for d in deadlines if d is not None]
+        if 'toast' in self.regions:
+            deadlines.append(self.regions['toast'].expires)
+        if deadlines:
+            interval = min(deadlines) - now
+        else:
+            interval = self.idle_interval
+        self.refresh_interval = max(interval, self.min_interval)
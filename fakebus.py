@@ -0,0 +1,249 @@
+import errno
+
+from smbus2 import I2cFunc, I2C_SMBUS_BLOCK_MAX
+
+# number of argument bytes following each multi-byte SSD1306 command
+CMD_ARGS = {
+    0x20: 1,    # memory addressing mode
+    0x21: 2,    # column address
+    0x22: 2,    # page address
+    0x26: 6,    # right horizontal scroll setup
+    0x27: 6,    # left horizontal scroll setup
+    0x29: 5,    # vertical and right horizontal scroll setup
+    0x2a: 5,    # vertical and left horizontal scroll setup
+    0x81: 1,    # contrast
+    0x8d: 1,    # charge pump
+    0xa3: 2,    # vertical scroll area
+    0xa8: 1,    # multiplex ratio
+    0xd3: 1,    # display offset
+    0xd5: 1,    # osc division
+    0xd9: 1,    # pre-charge period
+    0xda: 1,    # com pins
+    0xdb: 1,    # vcomh
+}
+
+HORIZONTAL, VERTICAL, PAGE = 0, 1, 2
+
+
+class FakeSSD1306Bus(object):
+    """In-memory SSD1306 speaking the subset of SMBus that OLEDCtrl uses.
+
+    It decodes the command stream into panel registers, keeps a
+    page-major GDDRAM model and counts ioctls, i2c transactions and
+    payload bytes, so the render path can run and be measured without
+    /dev/i2c-*."""
+
+    def __init__(self, bus=None, address=0x3c, width=128, pages=8,
+                 funcs=I2cFunc.I2C | I2cFunc.SMBUS_I2C_BLOCK):
+        self.address = address
+        self.width = width
+        self.pages = pages
+        self.funcs = funcs
+        self.fd = None
+
+        self.gddram = bytearray(width * pages)
+        self.reset()
+        self.reset_counters()
+
+        if bus is not None:
+            self.open(bus)
+
+    def reset(self):
+        # power-on register values
+        self.display_on = False
+        self.contrast = 0x7f
+        self.inverse = False
+        self.charge_pump = False
+        self.addressing_mode = PAGE
+        self.col_start, self.col_end = 0, self.width - 1
+        self.page_start, self.page_end = 0, self.pages - 1
+        self.col = 0
+        self.page = 0
+        self.start_line = 0
+        self.scroll = None
+        self.scroll_active = False
+        self.registers = {}
+
+        self._cmd = None
+        self._args = []
+
+    def reset_counters(self):
+        self.ioctls = 0
+        self.transactions = 0
+        self.bytes_written = 0
+        self.data_bytes = 0
+        self.cmd_bytes = 0
+        self.scroll_writes = 0
+
+    def counters(self):
+        return {
+            'ioctls': self.ioctls,
+            'transactions': self.transactions,
+            'bytes': self.bytes_written,
+            'data_bytes': self.data_bytes,
+            'cmd_bytes': self.cmd_bytes,
+            'scroll_writes': self.scroll_writes,
+        }
+
+    # SMBus interface
+
+    def open(self, bus):
+        self.fd = -1
+
+    def close(self):
+        self.fd = None
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        if len(data) > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError("Data length cannot exceed %d bytes" % I2C_SMBUS_BLOCK_MAX)
+        self.ioctls += 1
+        self._transfer(i2c_addr, bytes((register,)) + bytes(data))
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self.ioctls += 1
+        self._transfer(i2c_addr, bytes((register, value)))
+
+    def i2c_rdwr(self, *i2c_msgs):
+        self.ioctls += 1
+        for msg in i2c_msgs:
+            self._transfer(msg.addr, bytes(msg))
+
+    # SSD1306 model
+
+    def _transfer(self, addr, payload):
+        if addr != self.address:
+            raise OSError(errno.EREMOTEIO, 'no ack from 0x%02x' % addr)
+
+        self.transactions += 1
+        self.bytes_written += len(payload)
+
+        idx = 0
+        while idx < len(payload):
+            control = payload[idx]
+            idx += 1
+            if control & 0x80:
+                # Co set: a single byte follows, then another control byte
+                chunk = payload[idx:idx + 1]
+                idx += 1
+            else:
+                chunk = payload[idx:]
+                idx = len(payload)
+
+            if control & 0x40:
+                self._data(chunk)
+            else:
+                for b in chunk:
+                    self._command(b)
+
+    def _command(self, b):
+        self.cmd_bytes += 1
+
+        if self._cmd is not None:
+            self._args.append(b)
+            if len(self._args) == CMD_ARGS[self._cmd]:
+                cmd, args = self._cmd, self._args
+                self._cmd, self._args = None, []
+                self._apply(cmd, args)
+        elif b in CMD_ARGS:
+            self._cmd = b
+        else:
+            self._apply(b, [])
+
+    def _apply(self, cmd, args):
+        if cmd == 0x20:
+            self.addressing_mode = args[0] & 0x03
+        elif cmd == 0x21:
+            self.col_start, self.col_end = args[0], args[1]
+            self.col = self.col_start
+        elif cmd == 0x22:
+            self.page_start, self.page_end = args[0] & 0x07, args[1] & 0x07
+            self.page = self.page_start
+        elif cmd in (0x26, 0x27):
+            self.scroll = {
+                'direction': 'right' if cmd == 0x26 else 'left',
+                'start_page': args[1] & 0x07,
+                'interval': args[2] & 0x07,
+                'end_page': args[3] & 0x07,
+            }
+        elif cmd in (0x29, 0x2a):
+            self.scroll = {
+                'direction': 'right' if cmd == 0x29 else 'left',
+                'start_page': args[1] & 0x07,
+                'interval': args[2] & 0x07,
+                'end_page': args[3] & 0x07,
+                'vertical_offset': args[4] & 0x3f,
+            }
+        elif cmd == 0x2e:
+            self.scroll_active = False
+        elif cmd == 0x2f:
+            self.scroll_active = True
+        elif cmd == 0x81:
+            self.contrast = args[0]
+        elif cmd == 0x8d:
+            self.charge_pump = bool(args[0] & 0x04)
+        elif cmd in (0xa6, 0xa7):
+            self.inverse = cmd == 0xa7
+        elif cmd in (0xae, 0xaf):
+            self.display_on = cmd == 0xaf
+        elif 0x00 <= cmd <= 0x0f:
+            self.col = (self.col & 0xf0) | cmd
+        elif 0x10 <= cmd <= 0x1f:
+            self.col = (self.col & 0x0f) | ((cmd & 0x0f) << 4)
+        elif 0x40 <= cmd <= 0x7f:
+            self.start_line = cmd & 0x3f
+        elif 0xb0 <= cmd <= 0xb7:
+            self.page = cmd & 0x07
+        else:
+            # remaps, multiplex, timing and other registers we only record
+            self.registers[cmd] = tuple(args)
+
+    def _data(self, data):
+        self.data_bytes += len(data)
+
+        if self.scroll_active:
+            # datasheet: GDDRAM must not be written while scrolling
+            self.scroll_writes += 1
+
+        if self.addressing_mode == HORIZONTAL:
+            while data:
+                n = min(len(data), self.col_end - self.col + 1)
+                base = self.page * self.width + self.col
+                self.gddram[base:base + n] = data[:n]
+                data = data[n:]
+                self.col += n
+                if self.col > self.col_end:
+                    self.col = self.col_start
+                    self.page += 1
+                    if self.page > self.page_end:
+                        self.page = self.page_start
+
+        elif self.addressing_mode == VERTICAL:
+            for b in data:
+                self.gddram[self.page * self.width + self.col] = b
+                self.page += 1
+                if self.page > self.page_end:
+                    self.page = self.page_start
+                    self.col += 1
+                    if self.col > self.col_end:
+                        self.col = self.col_start
+
+        else:
+            for b in data:
+                self.gddram[self.page * self.width + self.col] = b
+                self.col = (self.col + 1) % self.width
+
+    # inspection helpers
+
+    def page_bytes(self, page):
+        start = page * self.width
+        return bytes(self.gddram[start:start + self.width])
+
+    def pixel(self, x, y):
+        return (self.gddram[(y // 8) * self.width + x] >> (y % 8)) & 1
+
+    def dump(self, on='#', off='.'):
+        rows = []
+        for y in range(self.pages * 8):
+            rows.append(''.join(on if self.pixel(x, y) else off
+                                for x in range(self.width)))
+        return '\n'.join(rows)
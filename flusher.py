@@ -0,0 +1,87 @@
+import threading
+from collections import deque
+
+
+class FrameFlusher(object):
+    """Writer thread that owns the panel bus.
+
+    Frames go through a one-slot mailbox: a frame submitted before the
+    previous one was written replaces it, so the bus always gets the
+    newest frame and composition never waits on a slow write. Other bus
+    jobs (display on/off, invalidation) are queued and run in order
+    before the next frame."""
+
+    def __init__(self, write_frame, name='oled-flush'):
+        self._write_frame = write_frame
+        self._cond = threading.Condition()
+        self._frame = None
+        self._jobs = deque()
+        self._busy = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+
+        self.dropped = 0
+        self.error = None
+
+    def start(self):
+        self._thread.start()
+
+    def alive(self):
+        return self._thread.is_alive()
+
+    def submit(self, *frame):
+        # frame is the argument tuple for write_frame
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._cond.notify_all()
+
+    def call(self, func, *args):
+        with self._cond:
+            self._jobs.append((func, args))
+            self._cond.notify_all()
+
+    def check(self):
+        # re-raise a bus error from the writer thread in the caller
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def sync(self, timeout=None):
+        # wait until every submitted job and frame is written
+        with self._cond:
+            return self._cond.wait_for(self._idle, timeout)
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _idle(self):
+        return not (self._jobs or self._busy or self._frame is not None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._idle() or self._stopping)
+                if self._idle():
+                    return
+                jobs = list(self._jobs)
+                self._jobs.clear()
+                frame, self._frame = self._frame, None
+                self._busy = True
+
+            try:
+                for func, args in jobs:
+                    func(*args)
+                if frame is not None:
+                    self._write_frame(*frame)
+            except Exception as e:
+                self.error = e
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
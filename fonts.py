@@ -1,3 +1,8 @@
+import copy
+
+from cache import LRUCache
+
+
 normal_font = {
     ' ': [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00],
     '!': [0x00, 0x00, 0x5F, 0x00, 0x00, 0x00, 0x00, 0x00],
@@ -97,10 +102,153 @@ normal_font = {
     '˚': [0x00, 0x02, 0x05, 0x05, 0x02, 0x00, 0x00, 0x00],
 }
 
-inverted_font = {}
+unknown_char = [0xff, 0x81, 0x81, 0x81, 0x81, 0x81, 0x81, 0xff]
+
+# flips every pixel of a raster, for inverted lines
+INVERT = bytes.maketrans(bytes(range(256)), bytes(b ^ 0xff for b in range(256)))
 
-for c, l in normal_font.items():
-    new_l = [i ^ 0xff for i in l]
-    inverted_font[c] = new_l
 
-unknown_char = [0xff, 0x81, 0x81, 0x81, 0x81, 0x81, 0x81, 0xff]
+def fallback_rows(font, c, pages):
+    # the glyph of `c` in `font` as `pages` latin-1 row strings, or None
+    # if it has none; rows beyond the font's height are blank
+    if font is None or c not in font:
+        return None
+    glyph = font.glyph(c)
+    advance = len(glyph) // font.pages
+    rows = []
+    for k in range(pages):
+        row = glyph[k * advance:(k + 1) * advance] if k < font.pages else b''
+        rows.append(row.ljust(advance, b'\0').decode('latin-1'))
+    return rows
+
+
+def text_blocks(text):
+    # the code point pages, 256 code points each, a text draws from
+    if text.isascii():
+        return (0,)
+    return {ord(c) >> 8 for c in text}
+
+
+class _GlyphTable(dict):
+    # str.translate table, characters without a glyph get `unknown` or
+    # are faulted in from the font's fallback
+
+    def __init__(self, unknown, font=None):
+        super().__init__()
+        self.unknown = unknown
+        self.font = font
+
+    def __missing__(self, code):
+        if self.font is None:
+            return self.unknown
+        return self.font._fault(code)
+
+
+class CompiledFont(object):
+    """Fixed width font compiled for rasterizing whole lines.
+
+    Glyphs are stored in one bytes atlas indexed by code point, `width`
+    column bytes each. A line is rasterized by str.translate, mapping
+    every character to its glyph as a latin-1 string, and one encode;
+    inverted lines are translated once more through INVERT.
+
+    Characters the font lacks are drawn from `fallback`, any font of the
+    same height, e.g. a Unicode font from bdf.load_font(). Those glyphs
+    are kept by code point page, and leave the table with their page
+    when it drops out of the `page_cache` most recently drawn."""
+
+    # glyphs are one page high
+    pages = 1
+    height = 8
+
+    def __init__(self, glyphs, unknown=unknown_char, width=8, fallback=None,
+                 page_cache=8):
+        self.width = width
+        self.unknown = bytes(unknown)
+        self.fallback = fallback
+        # code point page -> codes of fallback glyphs in the table
+        self.page_cache = LRUCache(page_cache, on_evict=self._evict)
+
+        size = max(map(ord, glyphs)) + 1
+        atlas = bytearray(self.unknown * size)
+        for c, glyph in glyphs.items():
+            if len(glyph) != width:
+                raise ValueError('glyph %r is not %d columns wide' % (c, width))
+            start = ord(c) * width
+            atlas[start:start + width] = bytes(glyph)
+        self.atlas = bytes(atlas)
+        self._codes = frozenset(map(ord, glyphs))
+
+        self._table = _GlyphTable(self.unknown.decode('latin-1'),
+                                  self if fallback else None)
+        for code in self._codes:
+            start = code * width
+            self._table[code] = self.atlas[start:start + width].decode('latin-1')
+
+    def with_fallback(self, fallback):
+        # the same glyphs, drawing missing characters from `fallback`
+        font = copy.copy(self)
+        font.fallback = fallback
+        font.page_cache = LRUCache(self.page_cache.maxsize,
+                                   on_evict=font._evict)
+        font._table = _GlyphTable(self._table.unknown, font)
+        font._table.update((code, self._table[code]) for code in self._codes)
+        return font
+
+    def _fault(self, code):
+        rows = fallback_rows(self.fallback, chr(code), 1)
+        value = rows[0] if rows else self._table.unknown
+        block = code >> 8
+        codes = self.page_cache.get(block)
+        if codes is None:
+            codes = set()
+            self.page_cache.put(block, codes)
+        codes.add(code)
+        self._table[code] = value
+        return value
+
+    def _evict(self, block, codes):
+        for code in codes:
+            del self._table[code]
+
+    def _touch(self, text):
+        # keep the pages of fallback glyphs in use from being evicted
+        if self.fallback is not None and not text.isascii():
+            for block in text_blocks(text):
+                if block in self.page_cache:
+                    self.page_cache.get(block)
+
+    def counters(self):
+        return self.page_cache.counters()
+
+    def __contains__(self, c):
+        return ord(c) in self._codes
+
+    def glyph(self, c):
+        return self._table[ord(c)].encode('latin-1')
+
+    def render(self, text, inverted=False):
+        self._touch(text)
+        raster = text.translate(self._table).encode('latin-1')
+        if inverted:
+            raster = raster.translate(INVERT)
+        return raster
+
+    def render_line(self, text, width, inverted=False):
+        # exactly `width` columns, cut or padded with blanks
+        chars = -(-width // self.width)
+        raster = self.render(text[:chars].ljust(chars), inverted)
+        if len(raster) != width:
+            # fallback glyphs may be narrower or wider
+            fill = b'\xff' if inverted else b'\0'
+            raster = raster[:width].ljust(width, fill)
+        return raster
+
+    def text_width(self, text):
+        if self.fallback is None:
+            return len(text) * self.width
+        self._touch(text)
+        return len(text.translate(self._table))
+
+
+font = CompiledFont(normal_font)
@@ -0,0 +1,299 @@
+"""Images for the panel: PBM and PGM natively, PNG and the rest with Pillow.
+
+load_image() decodes a file to gray, shrinks it to fit a size, dithers
+it to one bit per pixel and converts it to page-major bytes, the layout
+of the framebuffer. Results are cached in memory and on disk, keyed by
+a hash of the file and the conversion parameters, so scenes can blit an
+image every frame while it is decoded once.
+
+Lit pixels are the ink of a PBM and the bright pixels of anything else,
+invert=True swaps them.
+"""
+import hashlib
+import io
+import os
+import struct
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+from bitmap import Image, rows_to_pages
+from cache import LRUCache, cache_dir as default_cache_dir, write_file
+
+CACHE_MAGIC = b'OLEDIMG1'
+# magic, width, height
+_HEADER = struct.Struct('<8sHH')
+
+DITHERS = ('threshold', 'floyd', 'ordered')
+
+# 8x8 Bayer matrix, the order in which pixels of a gray level light up
+_BAYER = [
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+]
+
+# gray bytes to b'0' / b'1' digits, by threshold
+_digit_tables = {}
+
+# 8 gray pixels of a PBM byte, 255 for ink
+_UNPACK = [bytes(255 if b >> (7 - i) & 1 else 0 for i in range(8))
+           for b in range(256)]
+
+# converted images by (path, file size, mtime, parameters)
+images = LRUCache(32)
+
+
+def _digits(level):
+    table = _digit_tables.get(level)
+    if table is None:
+        table = _digit_tables[level] = bytes(
+            0x31 if v >= level else 0x30 for v in range(256))
+    return table
+
+
+def _pack(digits, width):
+    # a row of b'0' / b'1' digits as MSB first bytes, PBM style
+    stride = (width + 7) // 8
+    if not digits:
+        return bytes(stride)
+    return (int(digits, 2) << (stride * 8 - width)).to_bytes(stride, 'big')
+
+
+def parse_pnm(data):
+    """Return (width, height, pixels) of a PBM (P1, P4) or PGM (P2, P5)
+    file, pixels being row-major gray bytes."""
+    magic = data[:2]
+    if magic not in (b'P1', b'P2', b'P4', b'P5'):
+        raise ValueError('not a PBM or PGM file')
+
+    fields = 2 if magic in (b'P1', b'P4') else 3
+    values = []
+    pos = 2
+    while len(values) < fields:
+        c = data[pos:pos + 1]
+        if not c:
+            raise ValueError('truncated header')
+        if c.isspace():
+            pos += 1
+        elif c == b'#':
+            while data[pos:pos + 1] not in (b'\n', b'\r', b''):
+                pos += 1
+        else:
+            end = pos
+            while data[end:end + 1].isdigit():
+                end += 1
+            if end == pos:
+                raise ValueError('bad header')
+            values.append(int(data[pos:end]))
+            pos = end
+    width, height = values[:2]
+    maxval = values[2] if fields == 3 else 1
+    count = width * height
+    # one whitespace byte ends the header
+    body = data[pos + 1:]
+
+    if magic == b'P4':
+        stride = (width + 7) // 8
+        pixels = b''.join(
+            b''.join(_UNPACK[b] for b in body[y * stride:(y + 1) * stride])
+            [:width] for y in range(height))
+    elif magic == b'P1':
+        text = b' '.join(line.split(b'#')[0] for line in body.splitlines())
+        pixels = text.translate(None, b' \t\r\n\v\f')[:count]
+        pixels = pixels.translate(bytes.maketrans(b'01', b'\x00\xff'))
+    else:
+        if magic == b'P5':
+            if maxval > 255:
+                # 16 bit samples, the high byte is enough
+                raw = body[:2 * count:2]
+                maxval >>= 8
+            else:
+                raw = body[:count]
+        else:
+            text = b' '.join(line.split(b'#')[0] for line in body.splitlines())
+            raw = bytes(min(int(v), maxval) >> (8 if maxval > 255 else 0)
+                        for v in text.split()[:count])
+            maxval = min(maxval, 255)
+        # PGM is dark at 0, which is unlit too
+        scale = bytes(min(v * 255 // max(maxval, 1), 255) for v in range(256))
+        pixels = raw.translate(scale)
+
+    if len(pixels) != count:
+        raise ValueError('truncated image')
+    return width, height, pixels
+
+
+def _fit(width, height, size):
+    # shrink to fit `size`, keeping the aspect ratio
+    if size is None:
+        return width, height
+    max_w, max_h = size
+    if width <= max_w and height <= max_h:
+        return width, height
+    scale = min(max_w / width, max_h / height)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+def _open_pil(data, size):
+    if PILImage is None:
+        raise RuntimeError('Pillow is not available')
+    img = PILImage.open(io.BytesIO(data))
+    # transparent pixels are unlit
+    img = img.convert('RGBA')
+    background = PILImage.new('RGBA', img.size, (0, 0, 0, 255))
+    img = PILImage.alpha_composite(background, img).convert('L')
+    new_size = _fit(img.width, img.height, size)
+    if new_size != img.size:
+        img = img.resize(new_size, PILImage.LANCZOS)
+    return img.width, img.height, img.tobytes()
+
+
+def scale(width, height, pixels, new_width, new_height):
+    """Shrink gray pixels by averaging the source pixels each target
+    pixel covers."""
+    xs = [(x * width // new_width,
+           max((x + 1) * width // new_width, x * width // new_width + 1))
+          for x in range(new_width)]
+    out = bytearray(new_width * new_height)
+    i = 0
+    for y in range(new_height):
+        y0 = y * height // new_height
+        y1 = max((y + 1) * height // new_height, y0 + 1)
+        rows = [pixels[r * width:(r + 1) * width] for r in range(y0, y1)]
+        for x0, x1 in xs:
+            total = sum(sum(row[x0:x1]) for row in rows)
+            out[i] = total // ((x1 - x0) * (y1 - y0))
+            i += 1
+    return bytes(out)
+
+
+def threshold(width, height, pixels, level=128):
+    """Light the pixels at `level` or above, returns PBM style rows."""
+    table = _digits(level)
+    return b''.join(_pack(pixels[y * width:(y + 1) * width].translate(table),
+                          width) for y in range(height))
+
+
+def ordered(width, height, pixels):
+    """Dither against the 8x8 Bayer matrix, returns PBM style rows."""
+    out = []
+    digits = bytearray(width)
+    for y in range(height):
+        row = pixels[y * width:(y + 1) * width]
+        bayer = _BAYER[y & 7]
+        # every eighth pixel shares a threshold
+        for phase in range(min(8, width)):
+            level = bayer[phase] * 4 + 2
+            digits[phase::8] = row[phase::8].translate(_digits(level))
+        out.append(_pack(bytes(digits), width))
+    return b''.join(out)
+
+
+def floyd_steinberg(width, height, pixels):
+    """Diffuse the error of every pixel to its neighbours, returns PBM
+    style rows."""
+    out = []
+    errors = [0] * (width + 2)
+    for y in range(height):
+        row = pixels[y * width:(y + 1) * width]
+        # errors[x + 1] is the error carried to pixel x of this row
+        cur = errors
+        errors = [0] * (width + 2)
+        digits = bytearray(width)
+        carry = 0
+        for x in range(width):
+            value = row[x] + cur[x + 1] + carry
+            if value >= 128:
+                digits[x] = 0x31
+                err = value - 255
+            else:
+                digits[x] = 0x30
+                err = value
+            carry = err * 7 >> 4
+            errors[x] += err * 3 >> 4
+            errors[x + 1] += err * 5 >> 4
+            errors[x + 2] += err >> 4
+        out.append(_pack(bytes(digits), width))
+    return b''.join(out)
+
+
+def convert_image(data, size=None, dither='floyd', level=128, invert=False):
+    """Turn the contents of an image file into an Image."""
+    if data[:1] == b'P' and data[1:2] in b'1245':
+        width, height, pixels = parse_pnm(data)
+        new_width, new_height = _fit(width, height, size)
+        if (new_width, new_height) != (width, height):
+            pixels = scale(width, height, pixels, new_width, new_height)
+            width, height = new_width, new_height
+    else:
+        width, height, pixels = _open_pil(data, size)
+
+    if invert:
+        pixels = bytes(255 - v for v in pixels)
+
+    if dither == 'threshold':
+        rows = threshold(width, height, pixels, level)
+    elif dither == 'ordered':
+        rows = ordered(width, height, pixels)
+    elif dither == 'floyd':
+        rows = floyd_steinberg(width, height, pixels)
+    else:
+        raise ValueError('unknown dither %r' % dither)
+
+    return Image(width, height, rows_to_pages(rows, width, height))
+
+
+def _read_cache(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, width, height = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:]
+    if magic != CACHE_MAGIC or len(body) != width * ((height + 7) // 8):
+        raise ValueError('bad image cache %s' % path)
+    return Image(width, height, body)
+
+
+def load_image(path, size=None, dither='floyd', level=128, invert=False,
+               cache_dir=None):
+    """Load an image file as an Image of at most `size` (width, height).
+
+    dither is 'threshold' (lit at `level` and above), 'floyd'
+    (Floyd-Steinberg) or 'ordered' (Bayer)."""
+    if dither not in DITHERS:
+        raise ValueError('unknown dither %r' % dither)
+    size = tuple(size) if size else None
+    params = (size, dither, level, bool(invert))
+
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns) + params
+    image = images.get(key)
+    if image is not None:
+        return image
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(data)
+    digest.update(repr(params).encode('utf-8'))
+    cache = os.path.join(cache_dir or default_cache_dir('images'),
+                         digest.hexdigest()[:20] + '.img')
+
+    try:
+        image = _read_cache(cache)
+    except (OSError, ValueError, struct.error):
+        image = convert_image(data, size, dither, level, invert)
+        try:
+            write_file(cache, _HEADER.pack(CACHE_MAGIC, image.width,
+                                           image.height) + image.data)
+        except OSError:
+            pass
+
+    images.put(key, image)
+    return image
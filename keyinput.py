@@ -0,0 +1,433 @@
+import errno
+import os
+import select
+import time
+from collections import deque, namedtuple
+from ctypes import (c_char, c_int32, c_uint32, c_uint64, sizeof,
+                    Structure)
+from fcntl import ioctl
+
+GPIO_ROOT = '/sys/class/gpio'
+GPIO_CHIP = '/dev/gpiochip0'
+
+# kind is 'press', 'release', 'long' or 'repeat', time is time.monotonic()
+KeyEvent = namedtuple('KeyEvent', 'key kind time')
+
+
+class KeyQueue(object):
+    """Turns raw key edges into a queue of KeyEvents.
+
+    An edge that follows the last accepted edge of its key by less than
+    `debounce` is bounce; the key settles to its raw level once that has
+    been stable for `debounce`. A held key gets one 'long' event after
+    `long_press`, and 'repeat' events starting after `repeat_delay` whose
+    interval shrinks by `repeat_accel` per repeat down to `repeat_min`."""
+
+    def __init__(self, debounce=0.02, long_press=0.6, repeat_delay=0.4,
+                 repeat_interval=0.15, repeat_min=0.03, repeat_accel=0.8):
+        self.debounce = debounce
+        self.long_press = long_press
+        self.repeat_delay = repeat_delay
+        self.repeat_interval = repeat_interval
+        self.repeat_min = repeat_min
+        self.repeat_accel = repeat_accel
+
+        self.events = deque()
+        # key -> (level, time) of the last raw edge
+        self._raw = {}
+        # key -> debounced level and the time it was accepted
+        self._level = {}
+        self._edge_time = {}
+        # key -> [press time, next repeat, repeat interval, long sent]
+        self._held = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def feed(self, key, pressed, ts):
+        self._raw[key] = (pressed, ts)
+        if pressed == self._level.get(key, False):
+            return
+        if ts - self._edge_time.get(key, float('-inf')) < self.debounce:
+            # bounce, or a short glitch poll() settles later
+            return
+        self._accept(key, pressed, ts)
+
+    def _accept(self, key, pressed, ts):
+        self._level[key] = pressed
+        self._edge_time[key] = ts
+        if pressed:
+            self._held[key] = [ts, ts + self.repeat_delay,
+                               self.repeat_interval, False]
+            self.events.append(KeyEvent(key, 'press', ts))
+        else:
+            self._held.pop(key, None)
+            self.events.append(KeyEvent(key, 'release', ts))
+
+    def poll(self, now):
+        # settle bounced keys and queue long/repeat events due by `now`
+        for key, (pressed, ts) in self._raw.items():
+            if pressed == self._level.get(key, False):
+                continue
+            settle = self._edge_time[key] + self.debounce
+            if now >= settle:
+                self._accept(key, pressed, max(ts, settle))
+
+        for key, held in self._held.items():
+            start, next_repeat, interval, long_sent = held
+            if not long_sent and now - start >= self.long_press:
+                held[3] = True
+                self.events.append(
+                    KeyEvent(key, 'long', start + self.long_press))
+
+            if now >= next_repeat:
+                # one repeat per poll, a busy loop must not get a burst
+                self.events.append(KeyEvent(key, 'repeat', next_repeat))
+                held[1] = max(next_repeat + interval, now)
+                held[2] = max(interval * self.repeat_accel, self.repeat_min)
+
+    def next_deadline(self):
+        # time poll() has something to do, or None
+        deadlines = []
+        for key, (pressed, ts) in self._raw.items():
+            if pressed != self._level.get(key, False):
+                deadlines.append(self._edge_time[key] + self.debounce)
+
+        for start, next_repeat, interval, long_sent in self._held.values():
+            deadlines.append(next_repeat)
+            if not long_sent:
+                deadlines.append(start + self.long_press)
+
+        return min(deadlines) if deadlines else None
+
+    def take(self):
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def take_key(self, key):
+        # remove and return the queued events of one key
+        taken = [e for e in self.events if e.key == key]
+        if taken:
+            self.events = deque(e for e in self.events if e.key != key)
+        return taken
+
+
+class SysfsKeys(object):
+    """Keys on sysfs GPIO pins, read by polling their value files."""
+
+    # True if wait() returns as soon as a key changes
+    edge_triggered = False
+
+    def __init__(self, key2pin, keys, root=GPIO_ROOT):
+        self.key2pin = key2pin
+        self.keys = keys
+        self.root = root
+        self._levels = {}
+
+    def _path(self, key, name):
+        return '%s/gpio%d/%s' % (self.root, self.key2pin[key], name)
+
+    def _write(self, path, value):
+        with open(path, 'w') as f:
+            f.write(value + '\n')
+
+    def setup(self):
+        for key in self.keys:
+            self._write(self.root + '/export', '%d' % self.key2pin[key])
+
+        for key in self.keys:
+            self._write(self._path(key, 'direction'), 'in')
+
+    def cleanup(self):
+        for key in self.keys:
+            self._write(self.root + '/unexport', '%d' % self.key2pin[key])
+
+    def pressed(self, key):
+        with open(self._path(key, 'value')) as f:
+            return f.read(1) == '1'
+
+    def read_events(self):
+        # (key, pressed, timestamp) edges since the last call, found by
+        # comparing the levels with the ones seen last time
+        now = time.monotonic()
+        events = []
+        for key in self.keys:
+            pressed = self.pressed(key)
+            if pressed != self._levels.get(key, False):
+                self._levels[key] = pressed
+                events.append((key, pressed, now))
+        return events
+
+    def wait(self, timeout):
+        # nothing tells us about key changes, so just sleep
+        time.sleep(timeout)
+        return False
+
+
+class SysfsPollKeys(SysfsKeys):
+    """Edge-triggered sysfs keys.
+
+    setup() sets edge=both and keeps the value files open, wait() blocks
+    in poll() on POLLPRI until a key changes or the timeout expires. Pins
+    that refuse edge detection make it fall back to polling."""
+
+    def __init__(self, key2pin, keys, root=GPIO_ROOT):
+        super().__init__(key2pin, keys, root)
+        self.edge_triggered = False
+        self._fds = {}
+        self._poller = None
+
+    def setup(self):
+        super().setup()
+
+        try:
+            for key in self.keys:
+                self._write(self._path(key, 'edge'), 'both')
+        except OSError:
+            # no interrupt on this pin, keep polling
+            return
+
+        self._poller = select.poll()
+        for key in self.keys:
+            fd = os.open(self._path(key, 'value'), os.O_RDONLY)
+            self._fds[key] = fd
+            # a pending edge is reported until the value is read
+            os.read(fd, 8)
+            self._poller.register(fd, select.POLLPRI | select.POLLERR)
+
+        self.edge_triggered = True
+
+    def cleanup(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        self._poller = None
+
+        if self.edge_triggered:
+            for key in self.keys:
+                self._write(self._path(key, 'edge'), 'none')
+            self.edge_triggered = False
+
+        super().cleanup()
+
+    def pressed(self, key):
+        fd = self._fds.get(key)
+        if fd is None:
+            return super().pressed(key)
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        return os.read(fd, 1) == b'1'
+
+    def wait(self, timeout):
+        if not self.edge_triggered:
+            return super().wait(timeout)
+
+        if timeout is not None:
+            timeout = timeout * 1000
+        events = self._poller.poll(timeout)
+
+        # read to acknowledge the edges, or poll() keeps firing
+        for fd, _ in events:
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.read(fd, 8)
+
+        return bool(events)
+
+
+#############################################################
+# GPIO character device, uapi/linux/gpio.h (v2 line requests)
+
+GPIO_MAX_NAME_SIZE = 32
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+
+GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+GPIO_V2_LINE_FLAG_EDGE_RISING = 1 << 4
+GPIO_V2_LINE_FLAG_EDGE_FALLING = 1 << 5
+
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE = 3
+
+GPIO_V2_LINE_EVENT_RISING_EDGE = 1
+GPIO_V2_LINE_EVENT_FALLING_EDGE = 2
+
+
+class gpio_v2_line_attribute(Structure):
+    # the trailing union (flags/values/debounce_period_us) as one u64
+    _fields_ = [
+        ('id', c_uint32),
+        ('padding', c_uint32),
+        ('value', c_uint64)]
+
+
+class gpio_v2_line_config_attribute(Structure):
+    _fields_ = [
+        ('attr', gpio_v2_line_attribute),
+        ('mask', c_uint64)]
+
+
+class gpio_v2_line_config(Structure):
+    _fields_ = [
+        ('flags', c_uint64),
+        ('num_attrs', c_uint32),
+        ('padding', c_uint32 * 5),
+        ('attrs', gpio_v2_line_config_attribute * GPIO_V2_LINE_NUM_ATTRS_MAX)]
+
+
+class gpio_v2_line_request(Structure):
+    _fields_ = [
+        ('offsets', c_uint32 * GPIO_V2_LINES_MAX),
+        ('consumer', c_char * GPIO_MAX_NAME_SIZE),
+        ('config', gpio_v2_line_config),
+        ('num_lines', c_uint32),
+        ('event_buffer_size', c_uint32),
+        ('padding', c_uint32 * 5),
+        ('fd', c_int32)]
+
+
+class gpio_v2_line_values(Structure):
+    _fields_ = [
+        ('bits', c_uint64),
+        ('mask', c_uint64)]
+
+
+class gpio_v2_line_event(Structure):
+    _fields_ = [
+        ('timestamp_ns', c_uint64),
+        ('id', c_uint32),
+        ('offset', c_uint32),
+        ('seqno', c_uint32),
+        ('line_seqno', c_uint32),
+        ('padding', c_uint32 * 6)]
+
+
+def _iowr(nr, size):
+    return (3 << 30) | (size << 16) | (0xb4 << 8) | nr
+
+
+GPIO_V2_GET_LINE_IOCTL = _iowr(0x07, sizeof(gpio_v2_line_request))
+GPIO_V2_LINE_GET_VALUES_IOCTL = _iowr(0x0e, sizeof(gpio_v2_line_values))
+
+
+class GpiochipKeys(object):
+    """Keys on a GPIO character device (/dev/gpiochipN).
+
+    The key lines are requested once as edge-detecting inputs through the
+    v2 line-request ioctl. Edges are read in batches from the line fd as
+    gpio_v2_line_event records carrying kernel timestamps (CLOCK_MONOTONIC,
+    in seconds here), and the key state is kept from those events.
+
+    Pass `line_fd` to skip the ioctls and read events from any fd, e.g.
+    the read end of a pipe fed with packed gpio_v2_line_event records."""
+
+    edge_triggered = True
+
+    def __init__(self, key2line, keys, chip=GPIO_CHIP, debounce=0.005,
+                 event_buffer_size=64, line_fd=None, consumer=b'oled-keys'):
+        self.key2line = key2line
+        self.keys = keys
+        self.chip = chip
+        self.debounce = debounce
+        self.event_buffer_size = event_buffer_size
+        self.line_fd = line_fd
+        self.consumer = consumer
+
+        self._line2key = {key2line[key]: key for key in keys}
+        self._state = {key: False for key in keys}
+        self._poller = None
+        self.events = []
+
+    @classmethod
+    def available(cls, chip=GPIO_CHIP):
+        return os.path.exists(chip)
+
+    def setup(self):
+        if self.line_fd is None:
+            self.line_fd = self._request_lines()
+            self._state = self._read_values()
+
+        os.set_blocking(self.line_fd, False)
+        self._poller = select.poll()
+        self._poller.register(self.line_fd, select.POLLIN | select.POLLPRI)
+
+    def cleanup(self):
+        if self.line_fd is not None:
+            # closing the line fd releases the lines
+            os.close(self.line_fd)
+            self.line_fd = None
+        self._poller = None
+
+    def _request_lines(self):
+        req = gpio_v2_line_request()
+        for idx, key in enumerate(self.keys):
+            req.offsets[idx] = self.key2line[key]
+        req.num_lines = len(self.keys)
+        req.consumer = self.consumer
+        req.event_buffer_size = self.event_buffer_size
+        req.config.flags = (GPIO_V2_LINE_FLAG_INPUT
+                            | GPIO_V2_LINE_FLAG_EDGE_RISING
+                            | GPIO_V2_LINE_FLAG_EDGE_FALLING)
+
+        if self.debounce:
+            attr = req.config.attrs[0]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_DEBOUNCE
+            attr.attr.value = int(self.debounce * 1e6)
+            attr.mask = (1 << len(self.keys)) - 1
+            req.config.num_attrs = 1
+
+        fd = os.open(self.chip, os.O_RDONLY)
+        try:
+            ioctl(fd, GPIO_V2_GET_LINE_IOCTL, req)
+        finally:
+            os.close(fd)
+        return req.fd
+
+    def _read_values(self):
+        values = gpio_v2_line_values()
+        values.mask = (1 << len(self.keys)) - 1
+        ioctl(self.line_fd, GPIO_V2_LINE_GET_VALUES_IOCTL, values)
+        return {key: bool(values.bits >> idx & 1)
+                for idx, key in enumerate(self.keys)}
+
+    def _drain(self):
+        # read every queued event without blocking
+        size = sizeof(gpio_v2_line_event)
+        while True:
+            try:
+                data = os.read(self.line_fd, size * self.event_buffer_size)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return
+                raise
+
+            n = len(data) // size
+            if not n:
+                return
+
+            for event in (gpio_v2_line_event * n).from_buffer_copy(data):
+                key = self._line2key.get(event.offset)
+                if key is None:
+                    continue
+                pressed = event.id == GPIO_V2_LINE_EVENT_RISING_EDGE
+                self._state[key] = pressed
+                self.events.append((key, pressed, event.timestamp_ns / 1e9))
+
+    def read_events(self):
+        # (key, pressed, timestamp) edges since the last call
+        self._drain()
+        events, self.events = self.events, []
+        return events
+
+    def pressed(self, key):
+        self._drain()
+        return self._state[key]
+
+    def wait(self, timeout):
+        if timeout is not None:
+            timeout = timeout * 1000
+        events = self._poller.poll(timeout)
+        if events:
+            self._drain()
+        return bool(events)
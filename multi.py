@@ -0,0 +1,172 @@
+import threading
+import time
+
+import smbus2 as smbus
+from keyinput import KeyQueue
+from oled import OLEDCtrl, KEY2PIN, open_font
+from transport import ResilientBus
+
+
+class MultiOLEDCtrl(object):
+    """Drive several panels from one process and one loop.
+
+    Every panel is a plain OLEDCtrl with its own framebuffer and scene
+    stack; fonts and rendered glyphs live at module level and are shared.
+    Panels should flush on their own writer thread (threaded_flush), so
+    frames for panels on different buses are written concurrently while
+    panels on the same bus take turns through that bus's lock.
+
+    The three keys go to the focused panel. If `focus_key` is set, that
+    key cycles the focus instead of reaching a scene."""
+
+    def __init__(self, panels, key2pin=KEY2PIN, keys=(1, 2, 3),
+                 focus_key=None):
+        self.panels = list(panels)
+        self.keys = keys
+        self.key2pin = key2pin
+        # one set of keys, shared by every panel
+        self.key_input = self.panels[0].key_input
+        for panel in self.panels:
+            panel.key_input = self.key_input
+        # key events queue up on the focused panel only
+        self.key_queue = self.panels[0].key_queue
+        for panel in self.panels[1:]:
+            panel.key_queue = KeyQueue()
+        self.focus_key = focus_key
+        self.focus_idx = 0
+        self.loop_break = False
+
+    @classmethod
+    def from_specs(cls, specs, ctrl_kwargs=None, **kwargs):
+        """Build panels from dicts with init_scene, bus_num and addr.
+
+        Panels on the same bus number share one SMBus, its lock and its
+        reconnect handling."""
+        ctrl_kwargs = dict(ctrl_kwargs or {})
+        ctrl_kwargs.setdefault('threaded_flush', True)
+        # fonts are loaded once, so every panel draws with the same font
+        # object and shares its glyph pages and raster cache entries
+        ctrl_kwargs['font'] = open_font(ctrl_kwargs.get('font'),
+                                        ctrl_kwargs.pop('fallback_font', None))
+
+        buses = {}
+        panels = []
+        for spec in specs:
+            spec = dict(spec)
+            bus_num = spec.pop('bus_num', 0)
+            if bus_num not in buses:
+                buses[bus_num] = cls._open_bus(bus_num)
+            bus, lock, bus_panels = buses[bus_num]
+
+            panel = OLEDCtrl(bus=bus, bus_lock=lock,
+                             key2pin=kwargs.get('key2pin', KEY2PIN),
+                             keys=kwargs.get('keys', (1, 2, 3)),
+                             **dict(ctrl_kwargs, **spec))
+            bus_panels.append(panel)
+            panels.append(panel)
+
+        return cls(panels, **kwargs)
+
+    @staticmethod
+    def _open_bus(bus_num):
+        bus_panels = []
+
+        def reinit_all(raw_bus):
+            for panel in bus_panels:
+                panel.reinit_display(raw_bus)
+
+        bus = ResilientBus(lambda: smbus.SMBus(bus_num), on_reopen=reinit_all)
+        return bus, threading.RLock(), bus_panels
+
+    @property
+    def focus(self):
+        return self.panels[self.focus_idx]
+
+    def set_focus(self, idx):
+        old = self.focus
+        old.key_queue = KeyQueue()
+        old._held_keys.clear()
+
+        self.focus_idx = idx % len(self.panels)
+        panel = self.focus
+        panel.key_queue = self.key_queue
+        panel._held_keys.clear()
+        # wake the newly focused panel
+        panel.display_refresh_time = 0
+        panel.extend_display_off_time()
+
+    def init_setup(self):
+        now = time.monotonic()
+        for panel in self.panels:
+            panel.current_time = now
+            panel.init_display()
+        # the first panel may fall back to other key input, which all
+        # panels then share
+        self.panels[0].init_gpio()
+        self.key_input = self.panels[0].key_input
+        for panel in self.panels[1:]:
+            panel.key_input = self.key_input
+
+    def loop(self):
+
+        while not self.loop_break:
+
+            timeouts = [p.next_wait_timeout() for p in self.panels]
+            timeouts = [t for t in timeouts if t is not None]
+            self.key_input.wait(min(timeouts) if timeouts else None)
+
+            now = time.monotonic()
+            for panel in self.panels:
+                panel.current_time = now
+                panel.perf.count('wakeups')
+
+            self.poll_keys()
+            for panel in self.panels:
+                panel.run_timers()
+
+            if self.focus_key:
+                taken = self.focus.key_queue.take_key(self.focus_key)
+                for event in taken:
+                    if event.kind == 'press':
+                        self.set_focus(self.focus_idx + 1)
+
+            for panel in self.panels:
+                panel.update()
+                if panel.flusher:
+                    panel.flusher.check()
+                panel.perf.maybe_dump(panel.stats)
+
+                if panel.loop_break:
+                    self.loop_break = True
+
+    def poll_keys(self):
+        # keys are read once, pressed keys land on the focused panel
+        return self.focus.poll_keys()
+
+    def stats(self):
+        return [panel.stats() for panel in self.panels]
+
+    def cleanup(self):
+        for panel in self.panels:
+            panel.shutdown_display()
+
+        self.key_input.cleanup()
+
+        for panel in self.panels:
+            panel.display_off(force=True)
+        time.sleep(1)
+
+        # the panel that broke the loop decides what happens next
+        quitting = [p for p in self.panels if p.loop_break]
+        (quitting or self.panels)[0].exit_program()
+
+    def run(self):
+        try:
+            self.init_setup()
+            self.loop()
+
+        except Exception as e:
+            print("Error:", e)
+
+        finally:
+            self.cleanup()
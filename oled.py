@@ -1,3 +1,5 @@
+import heapq
+import itertools
 import os
 import random
 import smbus2 as smbus
@@ -5,7 +7,16 @@ import subprocess
 import time
 
 from consts import SHUTDOWN, REBOOT, EXIT
-from fonts import normal_font, inverted_font, unknown_char
+from flusher import FrameFlusher
+from stats import FrameStats
+from transport import ResilientBus
+from keyinput import (GpiochipKeys, KeyEvent, KeyQueue, SysfsKeys,
+                      SysfsPollKeys)
+import fonts
+from bdf import load_font
+from cache import LRUCache
+from canvas import Canvas
+from images import load_image
 
 KEY2PIN = {
     1: 0,
@@ -13,32 +24,159 @@ KEY2PIN = {
     3: 3,
 }
 
+# panel size in pixels
+WIDTH = 128
+HEIGHT = 64
+
+# blank columns between the end and the start of a scrolling line
+SCROLL_GAP = '    '
+
+# rasterized lines by (text, inverted, font, width), shared by all panels
+raster_cache = LRUCache(256)
+
+INIT_CMDS = [
+    0x2e,       # deactivate scroll
+    0xae,       # set display off
+    0x00,       # set lower column address
+    0x10,       # set higher column address
+    0x40,       # set display start line
+    0xb0, 0x81, # set page address
+    0xcf,       # set screen flip
+    0xa1,       # set segment remap
+    0xa8,       # set multiplex ratio
+    0x3f,       # set duty 1/64
+    0xc8,       # set com scan direction
+    0xd3, 0x00, # set display offset
+    0xd5, 0x80, # set osc division
+    0xd9, 0xf1, # set pre-charge period
+    0xda, 0x12, # set com pins
+    0xdb, 0x40, # set vcomh
+    0x8d, 0x14, # set charge pump on
+    0xa6,       # set display normal (not inverse)
+    0x20, 0x00, # set horizontal addressing mode
+    0xaf        # set display on
+]
+
+
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
     for i in range(0, len(lst), n):
         yield lst[i:i + n]
 
 
+def changed_runs(old, new, merge_gap=0):
+    """Return [start, end) column runs where `old` and `new` differ.
+
+    Runs separated by at most `merge_gap` unchanged columns are merged,
+    as every extra window costs a column/page address command."""
+    runs = []
+    start = last = None
+    for col, (a, b) in enumerate(zip(old, new)):
+        if a == b:
+            continue
+        if start is None:
+            start = col
+        elif col - last > merge_gap + 1:
+            runs.append((start, last + 1))
+            start = col
+        last = col
+
+    if start is not None:
+        runs.append((start, last + 1))
+
+    return runs
+
+
+def open_font(font=None, fallback_font=None):
+    """Return the font object for OLEDCtrl's font and fallback_font.
+
+    Either may be a font object or the path of a BDF or PCF font;
+    characters the font lacks are drawn from fallback_font."""
+    if isinstance(fallback_font, str):
+        fallback_font = load_font(fallback_font)
+    if isinstance(font, str):
+        font = load_font(font, fallback=fallback_font)
+    elif fallback_font:
+        font = (font or fonts.font).with_fallback(fallback_font)
+    return font if font else fonts.font
+
+
 class OLEDCtrl(object):
 
     def __init__(self, init_scene,
                  key2pin=KEY2PIN, keys=(1, 2, 3),
-                 bus_num=0, display_off_timeout=30.0,
+                 bus_num=0, bus=None, addr=0x3c, bus_lock=None,
+                 display_off_timeout=30.0,
                  polling_interval=0.2, turbo_polling_interval=0.01,
-                 line_length=16, line_num=8):
+                 line_length=None, line_num=None, merge_gap=8,
+                 transfer_mode='auto', threaded_flush=False,
+                 stats_path=None, stats_interval=60.0,
+                 hw_scroll=True, hw_scroll_interval=0b000,
+                 hw_scroll_settle=20,
+                 key_input='poll', key_queue=None, font=None,
+                 fallback_font=None, scroll_speed=24.0, splash_image=None):
 
         self.keys = keys
         self.key2pin = key2pin
-        self.bus = smbus.SMBus(bus_num)
+        # 'gpiochip' requests the lines from the GPIO character device,
+        # 'poll' waits for edges on the sysfs value files, 'sysfs' reads
+        # them every polling interval, 'auto' tries gpiochip and falls back
+        # to 'poll', or pass a ready input object
+        self._key_fallback = None
+        if key_input == 'auto':
+            if GpiochipKeys.available():
+                self._key_fallback = SysfsPollKeys(key2pin, keys)
+                key_input = GpiochipKeys(key2pin, keys)
+            else:
+                key_input = SysfsPollKeys(key2pin, keys)
+        elif key_input == 'gpiochip':
+            key_input = GpiochipKeys(key2pin, keys)
+        elif key_input == 'poll':
+            key_input = SysfsPollKeys(key2pin, keys)
+        elif key_input == 'sysfs':
+            key_input = SysfsKeys(key2pin, keys)
+        self.key_input = key_input
+        # debounced press/release/long/repeat events of key_input
+        self.key_queue = key_queue if key_queue else KeyQueue()
+        # any object with the SMBus write interface works, e.g. the
+        # in-memory panel in fakebus
+        if bus is None:
+            bus = ResilientBus(lambda: smbus.SMBus(bus_num),
+                               on_reopen=self.reinit_display)
+        self.bus = bus
+        self.addr = addr
+        # panels sharing one bus share a lock (an RLock, as a bus reopen
+        # replays the init of every panel on it from inside a write)
+        self.bus_lock = bus_lock
+        # 'rdwr' pushes whole windows through I2C_RDWR, 'smbus' splits
+        # them into 32-byte SMBus block writes, 'auto' picks by adapter
+        if transfer_mode == 'auto':
+            self.use_rdwr = bool(self.bus.funcs & smbus.I2cFunc.I2C)
+        else:
+            self.use_rdwr = transfer_mode == 'rdwr'
         self.polling_interval = polling_interval
         self.turbo_polling_interval = turbo_polling_interval
         self.display_off_timeout = display_off_timeout
-        self.line_length = line_length
-        self.line_num = line_num
+        # a font object, or the path of a BDF or PCF font; characters it
+        # lacks are drawn from fallback_font, e.g. a Unicode font
+        self.font = open_font(font, fallback_font)
+        # a text line is font.pages pages high, line_length is the number
+        # of average characters that fit, pixel widths decide for real;
+        # text is drawn in the first line_width columns, all of them
+        # unless line_length is given
+        self.width = WIDTH
+        self.page_num = HEIGHT // 8
+        max_lines = self.page_num // self.font.pages
+        self.line_length = line_length or self.width // self.font.width
+        self.line_width = self.width
+        if line_length:
+            self.line_width = min(line_length * self.font.width, self.width)
+        self.line_num = min(line_num or max_lines, max_lines)
+        self.merge_gap = merge_gap
 
         self.loop_break = False
         self.display_refresh_time = 0
-        self.current_time = time.time()
+        self.current_time = time.monotonic()
         self.extend_display_off_time()
 
         self.display_already_off = False
@@ -46,9 +184,72 @@ class OLEDCtrl(object):
         self._scenes = [init_scene]
         self.pending_key = None
         self.pending_scene = None
+        # keys whose press reached the current scene
+        self._held_keys = set()
         self.lines = {}
-        self.buffer = {}
-
+        # the framebuffer is one data transfer: the 0x40 control byte and
+        # the pages in GDDRAM order, lines are rendered into `line_views`
+        # in place and a full frame is sent straight from the buffer
+        self.framebuffer = bytearray(1 + self.width * self.page_num)
+        self.framebuffer[0] = 0x40
+        self.buffer = memoryview(self.framebuffer)[1:]
+        # the pages of a text line are adjacent in the buffer
+        line_size = self.width * self.font.pages
+        self.line_views = [self.buffer[pos * line_size:(pos + 1) * line_size]
+                           for pos in range(self.line_num)]
+        self._blank = bytes(len(self.buffer))
+        # pixel drawing on the same buffer, lines are rendered over it
+        self.canvas = Canvas(self.buffer, self.width, self.page_num * 8)
+        # last frame sent to the panel, None if GDDRAM content is unknown
+        self._sent = None
+        # pages of _sent the panel no longer shows as they are
+        self._stale_pages = set()
+
+        # a single 'marquee' line that fits the 128 column ring is left
+        # to the panel's horizontal scroll engine, interval is the
+        # SSD1306 frame interval code (0b000 = 5 frames per step).
+        # Writing any page stops the engine and resets the line, so that
+        # only happens once the rest of the panel has not changed for
+        # hw_scroll_settle frames; until then it scrolls in software
+        self.hw_scroll = hw_scroll
+        self.hw_scroll_interval = hw_scroll_interval
+        self.hw_scroll_settle = hw_scroll_settle
+        self.hw_scroll_page = None
+        self._hw_scroll_ok = False
+        # page the panel is scrolling now
+        self._scroll_page = None
+        # page of the marquee line, and the frames in a row the other
+        # pages stayed as they are in _still_ref
+        self._marquee_page = None
+        self._still_frames = 0
+        self._still_ref = memoryview(bytearray(len(self.buffer)))
+
+        # lines scrolled in software move `scroll_speed` pixels a second,
+        # pos -> ((text, inverted, font), strip rows, start time)
+        self.scroll_speed = scroll_speed
+        self._strips = {}
+        self._strips_used = set()
+
+        self.perf = FrameStats(stats_path, stats_interval)
+        self._frame_start = None
+        self._key_time = None
+
+        # call_later timers, a heap of [when, seq, func, args]
+        self._timers = []
+        self._timer_seq = itertools.count()
+
+        # with threaded_flush the bus is only touched by the writer thread
+        if threaded_flush:
+            self.flusher = FrameFlusher(self._render_frame)
+        else:
+            self.flusher = None
+
+        # an images.Image or image path shown by draw_splash(), random
+        # noise if None
+        if isinstance(splash_image, str):
+            splash_image = load_image(splash_image,
+                                      size=(self.width, self.canvas.height))
+        self.splash_image = splash_image
         self.splash = []
         self.gen_random_splash()
 
@@ -74,137 +275,317 @@ class OLEDCtrl(object):
 
     def init_setup(self):
 
-        self.current_time = time.time()
-
-        # initialize GPIO
-        for key in self.keys:
-            with open('/sys/class/gpio/export', 'w') as f:
-                pin = self.key2pin[key]
-                f.write('%d\n' % pin)
-            
-        tmpl = '/sys/class/gpio/gpio%d/direction'
-        for key in self.keys:
-            pin = self.key2pin[key]
-            path = tmpl % pin
-            with open(path, 'w') as f:
-                f.write('in\n')
-
-        self.bus.write_i2c_block_data(0x3c, 0x00, [
-            0xae,       # set display off
-            0x00,       # set lower column address
-            0x10,       # set higher column address
-            0x40,       # set display start line
-            0xb0, 0x81, # set page address
-            0xcf,       # set screen flip
-            0xa1,       # set segment remap
-            0xa8,       # set multiplex ratio
-            0x3f,       # set duty 1/64
-            0xc8,       # set com scan direction
-            0xd3, 0x00, # set display offset
-            0xd5, 0x80, # set osc division
-            0xd9, 0xf1, # set pre-charge period
-            0xda, 0x12, # set com pins
-            0xdb, 0x40, # set vcomh
-            0x8d, 0x14, # set charge pump on
-            0xa6,       # set display normal (not inverse)
-            0x20, 0x00, # set horizontal addressing mode
-            0xaf        # set display on
-        ])
+        self.current_time = time.monotonic()
+        self.init_gpio()
+        self.init_display()
+
+    def init_gpio(self):
+        try:
+            self.key_input.setup()
+        except OSError:
+            # e.g. a kernel without v2 line requests, or busy lines
+            if self._key_fallback is None:
+                raise
+            self.key_input, self._key_fallback = self._key_fallback, None
+            self.key_input.setup()
+
+    def init_display(self):
+        self._write_cmds(INIT_CMDS)
+        self._scroll_page = None
+        self.invalidate()
+
+        if self.flusher:
+            self.flusher.start()
+
+    def reinit_display(self, bus):
+        # replay the init sequence on a reopened bus, the next frame is
+        # sent in full since the transfer that failed may be half done
+        cmds = list(INIT_CMDS)
+        if self.display_already_off:
+            cmds.append(0xae)
+        self._write_blocks([(0x00, cmds)], bus)
+        self._scroll_page = None
+        self._sent = None
+        self.display_refresh_time = 0
 
     def loop(self):
 
         while not self.loop_break:
 
-            if self.display_already_off:
-                polling_interval = self.polling_interval
-            else:
-                polling_interval = self.turbo_polling_interval
-
-            time.sleep(polling_interval)
-            self.current_time = time.time()
-
-            if self.keydown(1):
-                continue
-
-            if self.keydown(2):
-                continue
-
-            if self.keydown(3):
-                continue
-
-            # not here until all key are released
-            # if display is still off, key press just wake up display
-
-            if self.display_already_off:
-                self.pending_key = None
-
-            # if pending_key or pending_scene exists, update scene
-
-            new_scene = self.pending_scene
-            self.pending_scene = None
+            self.key_input.wait(self.next_wait_timeout())
+            self.current_time = time.monotonic()
+            self.perf.count('wakeups')
+
+            self.poll_keys()
+            self.run_timers()
+            self.update()
+
+            if self.flusher:
+                self.flusher.check()
+
+            self.perf.maybe_dump(self.stats)
+
+    def stats(self):
+        snap = self.perf.snapshot()
+        if self.flusher:
+            snap['counters']['dropped_frames'] = self.flusher.dropped
+        if hasattr(self.bus, 'counters'):
+            snap['bus'] = self.bus.counters()
+        snap['raster_cache'] = raster_cache.counters()
+        if hasattr(self.font, 'counters'):
+            snap['font_pages'] = self.font.counters()
+        return snap
+
+    def call_later(self, delay, func, *args):
+        """Call func(*args) from the loop in `delay` seconds.
+
+        Returns a handle for cancel_timer()."""
+        timer = [time.monotonic() + delay, next(self._timer_seq), func, args]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    def cancel_timer(self, timer):
+        # dropped from the heap once it comes up
+        timer[2] = None
+
+    def run_timers(self):
+        timers = self._timers
+        now = time.monotonic()
+        while timers and timers[0][0] <= now:
+            _, _, func, args = heapq.heappop(timers)
+            if func:
+                func(*args)
+
+    def next_deadline(self, refresh=True):
+        # earliest monotonic time the loop has work to do, or None
+        if self.pending_scene:
+            return time.monotonic()
+
+        timers = self._timers
+        while timers and timers[0][2] is None:
+            heapq.heappop(timers)
+
+        deadlines = []
+        if timers:
+            deadlines.append(timers[0][0])
+
+        key_deadline = self.key_queue.next_deadline()
+        if key_deadline is not None:
+            deadlines.append(key_deadline)
+
+        if not self.display_already_off:
+            deadlines.append(self.display_off_time)
+            if refresh:
+                deadlines.append(self.display_refresh_time)
+
+        return min(deadlines) if deadlines else None
+
+    def next_wait_timeout(self):
+        # keys wake up edge triggered input, so it sleeps until the next
+        # deadline; other input still has to be polled
+        deadline = self.next_deadline()
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.monotonic(), 0)
+
+        if not self.key_input.edge_triggered:
+            interval = self.next_polling_interval()
+            timeout = interval if timeout is None else min(timeout, interval)
+
+        return timeout
+
+    def next_polling_interval(self):
+        if self.display_already_off:
+            return self.polling_interval
+        else:
+            return self.turbo_polling_interval
+
+    def poll_keys(self):
+        # queue the key edges seen since the last call, True if there are
+        # events to handle
+        queue = self.key_queue
+        for key, pressed, ts in self.key_input.read_events():
+            queue.feed(key, pressed, ts)
+        queue.poll(time.monotonic())
+
+        if queue:
+            # any key keeps the display on
+            self.extend_display_off_time()
+        return bool(queue)
+
+    def update(self):
+        new_scene, events = self.take_pending()
+        self.change_scene(new_scene)
+
+        # every queued event is handled in order, so key presses made
+        # while a frame was drawn still reach their scenes
+        for event in events:
+            if self.loop_break:
+                break
+            self.change_scene(self.handle_key_event(event))
+
+        if self.current_time >= self.display_off_time:
+            self.display_off()
+
+        # one more frame
+        elif self.current_time >= self.display_refresh_time:
+            s = self.begin_frame()
+            new_scene = s.draw(self)
+            self.end_frame(s, new_scene)
+
+    def change_scene(self, new_scene):
+        # scene change happens here only
+        if new_scene:
+            action, new_scene = self.parse_scene_change(new_scene)
+
+            if action == 'pop':
+                self.pop_scene()
+
+            elif action == 'push':
+                self.push_scene(new_scene)
+
+            elif action == 'normal':
+                self.scene = new_scene
+
+            # a release or repeat belongs to the scene that saw the press
+            self._held_keys.clear()
+
+        self.check_loop_break()
+
+    def take_pending(self):
+        events = self.key_queue.take()
+        # pending_key injects a press, e.g. from a benchmark
+        if self.pending_key:
+            events.append(KeyEvent(self.pending_key, 'press',
+                                   time.monotonic()))
+
+        # if display is still off, key press just wake up display
+        if events and self.display_already_off:
+            events = []
+            self.display_refresh_time = 0
+            self.extend_display_off_time()
+            self._held_keys.clear()
+
+        new_scene = self.pending_scene
+        self.pending_scene = None
+        self.pending_key = None
+        return new_scene, events
+
+    def key_event_action(self, event):
+        """Return the scene callback an event triggers, or None.
+
+        A press acts at once, unless the key has a long-press entry: then
+        a release before the long press acts as the short press. Repeats
+        act only for the scene's repeat_keys."""
+        key, kind = event.key, event.kind
+        s = self.scene
+
+        if kind == 'press':
+            self._held_keys.add(key)
+            if not s.has_long_key(key):
+                return 'key'
+
+        elif key not in self._held_keys:
+            return None
+
+        elif kind == 'release':
+            self._held_keys.discard(key)
+            if s.has_long_key(key):
+                return 'key'
+
+        elif kind == 'long':
+            if s.has_long_key(key):
+                self._held_keys.discard(key)
+                return 'long'
+
+        elif kind == 'repeat':
+            if key in s.repeat_keys and not s.has_long_key(key):
+                return 'key'
+
+        return None
+
+    def handle_key_event(self, event):
+        action = self.key_event_action(event)
+        if action is None:
+            return None
+
+        self.key_handled(event)
+        if action == 'long':
+            return self.scene.handle_long_key(event.key)
+        return self.scene.handle_key(event.key)
+
+    def key_handled(self, event):
+        # draw the next frame now, key_to_frame is measured from the edge
+        if self._key_time is None:
+            age = max(time.monotonic() - event.time, 0)
+            self._key_time = time.perf_counter() - age
+        self.display_refresh_time = 0
 
-            if self.pending_key:
-                new_scene = self.scene.handle_key(self.pending_key)
-                self.pending_key = None
+    def parse_scene_change(self, new_scene):
+        try:
+            action, new_scene = new_scene
+        except TypeError:
+            action = 'normal'
+        return action, new_scene
+
+    def check_loop_break(self):
+        if int(self.scene) in (SHUTDOWN, REBOOT, EXIT):
+            # or just break?
+            self.loop_break = True
+
+    def begin_frame(self):
+        self._frame_start = time.perf_counter()
+        self.display_on()
+        s = self.scene
+        if s.clear:
+            # cleared before drawing, so scenes can draw on the canvas
+            self.clear_lines()
+            self.clear_buffer()
+        return s
 
-            # scene change happens here only
-            if new_scene:
-                try:
-                    action, new_scene = new_scene
-                except TypeError:
-                    action = 'normal'
+    def end_frame(self, s, new_scene):
+        perf = self.perf
+        perf.observe('draw', time.perf_counter() - self._frame_start)
 
-                if action == 'pop':
-                    self.pop_scene()
+        # scene has drawn lines to self.lines
+        self.render(flush=s.flush,
+                    line_mode=s.line_mode,
+                    refresh_interval=s.refresh_interval)
 
-                elif action == 'push':
-                    self.push_scene(new_scene)
+        perf.count('frames')
+        now = time.perf_counter()
+        perf.observe('frame', now - self._frame_start)
+        if self._key_time is not None:
+            perf.observe('key_to_frame', now - self._key_time)
+            self._key_time = None
 
-                elif action == 'normal':
-                    self.scene = new_scene
+        s.run_post_cmds()
+        if new_scene:
+            self.pending_scene = new_scene
 
-            if int(self.scene) in (SHUTDOWN, REBOOT, EXIT):
-                # or just break?
-                self.loop_break = True
+    def cleanup(self):
 
-            if self.current_time > self.display_off_time:
-                self.display_off()
-                continue
- 
-            # one more frame
-            elif self.current_time > self.display_refresh_time:
-                self.display_on()
-                s = self.scene
-                if s.clear:
-                    self.clear_lines()
+        self.shutdown_display()
+        self.cleanup_gpio()
 
-                # scene draw lines to self.lines
-                print(s.frame)
-                new_scene = s.draw(self)
-                self.render(clear=s.clear,
-                            flush=s.flush,
-                            line_mode=s.line_mode,
-                            refresh_interval=s.refresh_interval)
+        # do it again just in case
+        self.display_off(force=True)
+        time.sleep(1)
 
-                s.run_post_cmds()
-                if new_scene:
-                    self.pending_scene = new_scene
-                    new_scene = None
+        self.exit_program()
 
-    def cleanup(self):
+    def shutdown_display(self):
+        if self.flusher:
+            self.flusher.stop()
+            self.flusher = None
 
         self.display_off(force=True)
 
+    def cleanup_gpio(self):
         # release GPIO
-        for key in self.keys:
-            with open('/sys/class/gpio/unexport', 'w') as f:
-                pin = self.key2pin[key]
-                f.write('%d\n' % pin)
-
-        # do it again just in case
-        self.display_off(force=True)
-        time.sleep(1)
+        self.key_input.cleanup()
 
+    def exit_program(self):
         if int(self.scene) == SHUTDOWN:
             print("shutdown!")
             os.system('shutdown now')
@@ -225,19 +606,6 @@ class OLEDCtrl(object):
         finally:
             self.cleanup()
 
-    def keydown(self, idx):
-        dev_tmpl = '/sys/class/gpio/gpio%d/value'
-        pin = self.key2pin[idx]
-        dev = dev_tmpl % pin
-        with open(dev) as f:
-            if f.read(1) == '1':
-                self.pending_key = idx
-                self.display_refresh_time = 0
-                self.extend_display_off_time()
-                return True
-            else:
-                return False
-
     def putline(self, line, pos=None, inverted=False, mode='truncate'):
         if not pos:
             if self.lines:
@@ -250,23 +618,52 @@ class OLEDCtrl(object):
 
         self.lines[pos] = (line, inverted, mode)
 
-    def render(self, clear, line_mode, flush, refresh_interval):
-        if clear:
-            self.clear_buffer()
-
+    def render(self, line_mode, flush, refresh_interval):
         if line_mode:
+            t = time.perf_counter()
             self.lines_to_buffer()
+            self.count_still_frames()
+            self.perf.observe('layout', time.perf_counter() - t)
 
         if flush:
             self.display_flush()
 
-        if refresh_interval > 0:
-            self.set_display_next_refresh_time(refresh_interval)
+        # scenes without an interval refresh continuously, but no more
+        # often than turbo polling, or the loop would spin
+        self.set_display_next_refresh_time(
+            max(refresh_interval, self.turbo_polling_interval))
 
     def display_flush(self):
         self.render_buffer()
 
+    def count_still_frames(self):
+        # how long the panel apart from the marquee line has been still
+        page = self._marquee_page
+        if page is None:
+            self._still_frames = 0
+            return
+        start = page * self.width
+        end = start + self.width
+        buf, ref = self.buffer, self._still_ref
+        if buf[:start] == ref[:start] and buf[end:] == ref[end:]:
+            self._still_frames += 1
+        else:
+            self._still_frames = 0
+        ref[:] = buf
+
     def lines_to_buffer(self):
+        # the panel can scroll one region only, several scrolling
+        # lines and lines taller than a page are all scrolled in software
+        self.hw_scroll_page = None
+        self._marquee_page = None
+        # it rotates whole pages, so not a shorter line, and is only
+        # worth it while the rest of the panel is still
+        self._hw_scroll_ok = (self.hw_scroll and self.font.pages == 1
+                              and self.line_width == self.width
+                              and self.scrolling_lines() == 1
+                              and self._still_frames >= self.hw_scroll_settle)
+        self._strips_used.clear()
+
         offset = 0
         for pos in range(self.line_num):
             line = self.lines.get(pos)
@@ -276,6 +673,11 @@ class OLEDCtrl(object):
                 delta = delta or 0
                 offset += delta
 
+        # a line that comes back starts scrolling from its beginning
+        for pos in list(self._strips):
+            if pos not in self._strips_used:
+                del self._strips[pos]
+
     def line_to_buffer(self, pos, line, inverted, mode):
 
         if pos >= self.line_num:
@@ -284,23 +686,30 @@ class OLEDCtrl(object):
         if not line:
             line = ''
 
-        char_num = len(line)
+        fits = self.font.text_width(line) <= self.line_width
 
-        if char_num > self.line_length:
+        if mode == 'marquee':
+            if self.font.pages == 1:
+                self._marquee_page = pos
+            if self._hw_scroll_ok and fits:
+                # panel rotates the page, we only send it once
+                self.hw_scroll_page = pos
+                lines = [line]
+            else:
+                self._strip_to_buffer(pos, line + ' ', inverted)
+                return 0
+
+        elif not fits:
 
             if mode == 'scroll':
-                frame = self.scene.frame
-                start = frame % char_num
-                end = start + self.line_length
-                line = line[start:end]
-                lines = [line]
+                self._strip_to_buffer(pos, line + SCROLL_GAP, inverted)
+                return 0
 
             elif mode == 'wrap':
-                lines = list(chunks(line, self.line_length))
+                lines = self.wrap_line(line)
 
-            # mode == 'truncate'
+            # mode == 'truncate', cut to the panel width when rendered
             else:
-                line = line[:self.line_length]
                 lines = [line]
         else:
             lines = [line]
@@ -310,7 +719,63 @@ class OLEDCtrl(object):
 
         return len(lines) - 1
 
-    # here len(line) <= self.line_length
+    def scrolling_lines(self):
+        n = 0
+        for line, inverted, mode in self.lines.values():
+            if mode == 'marquee':
+                n += 1
+            elif (mode == 'scroll'
+                  and self.font.text_width(line or '') > self.line_width):
+                n += 1
+        return n
+
+    def wrap_line(self, line):
+        # split into pieces that fit the line width
+        if self.font.text_width(line) == len(line) * self.font.width:
+            return list(chunks(line, self.line_width // self.font.width))
+
+        lines = []
+        start = 0
+        used = 0
+        for idx, c in enumerate(line):
+            w = self.font.text_width(c)
+            if used + w > self.line_width and idx > start:
+                lines.append(line[start:idx])
+                start = idx
+                used = 0
+            used += w
+        lines.append(line[start:])
+        return lines
+
+    def _strip_to_buffer(self, pos, text, inverted):
+        # the text is rendered once into a strip followed by its own
+        # first line width, so every scroll offset is a single slice
+        if pos >= self.line_num:
+            return
+
+        self._strips_used.add(pos)
+        key = (text, inverted, self.font)
+        entry = self._strips.get(pos)
+        width = self.line_width
+        if entry is None or entry[0] != key:
+            raster = self.font.render(text, inverted)
+            size = len(raster) // self.font.pages
+            fill = b'\xff' if inverted else b'\x00'
+            rows = []
+            for k in range(self.font.pages):
+                row = raster[k * size:(k + 1) * size].ljust(width, fill)
+                rows.append(memoryview(row + row[:width]))
+            entry = (key, rows, self.current_time)
+            self._strips[pos] = entry
+
+        _, rows, start = entry
+        period = len(rows[0]) - width
+        offset = int((self.current_time - start) * self.scroll_speed) % period
+        view = self.line_views[pos]
+        stride = self.width
+        for k, row in enumerate(rows):
+            view[k * stride:k * stride + width] = row[offset:offset + width]
+
     def _line_to_buffer(self, pos, line, inverted):
 
         if pos >= self.line_num:
@@ -319,52 +784,204 @@ class OLEDCtrl(object):
         if not line:
             line = ''
 
-        if inverted:
-            font = inverted_font
-        else:
-            font = normal_font
-
-        char_num = len(line)
-        diff = self.line_length - char_num
-        line = line + ' ' * diff
-
-        line_bs = [b for c in line for b in font.get(c, unknown_char)]
-
-        self.buffer[pos] = line_bs
+        width = self.line_width
+        raster = self.render_text(line, width, inverted)
+        view = self.line_views[pos]
+        stride = self.width
+        if width == stride:
+            view[:] = raster
+            return
+        # columns past the line length are left as they are
+        for k in range(self.font.pages):
+            row = raster[k * width:(k + 1) * width]
+            view[k * stride:k * stride + width] = row
+
+    def render_text(self, text, width, inverted=False):
+        # font.pages rows of exactly `width` columns, through the cache
+        key = (text, inverted, self.font, width)
+        raster = raster_cache.get(key)
+        if raster is None:
+            raster = self.font.render_line(text, width, inverted)
+            raster_cache.put(key, raster)
+        return raster
 
     def render_buffer(self):
-        space = normal_font[' ']
-        empty_line = space * self.line_length
+        # the writer thread gets a copy, as the next frame is composed
+        # in the framebuffer while this one is written
+        if self.flusher:
+            self.flusher.submit(bytearray(self.framebuffer),
+                                self.hw_scroll_page)
+        else:
+            self._render_frame(self.framebuffer, self.hw_scroll_page)
+
+    def _render_frame(self, frame, scroll_page=None):
+        # frame is a framebuffer: 0x40 and then the pages
+        t = time.perf_counter()
+        writes = []
+        width = self.width
+        data = memoryview(frame)[1:]
+        sent = self._sent
+        if sent is not None:
+            sent_data = memoryview(sent)[1:]
+
+        def page_of(buf, page):
+            return buf[page * width:(page + 1) * width]
+
+        def stop_scroll():
+            # the page content is rotated by now so it has to be resent
+            writes.append((0x00, [0x2e]))
+            self._stale_pages.add(self._scroll_page)
+            self._scroll_page = None
+
+        def data_writes():
+            # only send column runs that differ from what the panel shows
+            if sent == frame and not self._stale_pages:
+                return []
+            if sent is None:
+                return [self._window_cmds(0, width - 1, 0, self.page_num - 1),
+                        (None, frame)]
+            out = []
+            for page in range(self.page_num):
+                new = page_of(data, page)
+                if page in self._stale_pages:
+                    runs = [(0, width)]
+                else:
+                    old = page_of(sent_data, page)
+                    if old == new:
+                        continue
+                    runs = changed_runs(old, new, self.merge_gap)
+                for start, end in runs:
+                    out.append(self._window_cmds(start, end - 1, page, page))
+                    out.append((0x40, new[start:end]))
+            return out
+
+        # stop the scroll engine before its page is rewritten or moved
+        active = self._scroll_page
+        if active is not None and (active != scroll_page
+                                   or sent is None
+                                   or page_of(sent_data, active)
+                                   != page_of(data, active)):
+            stop_scroll()
+
+        blocks = data_writes()
+        if blocks and self._scroll_page is not None:
+            # GDDRAM must not be written while the panel scrolls, not
+            # even other pages; it is restarted below
+            stop_scroll()
+            blocks = data_writes()
+        writes.extend(blocks)
+
+        if scroll_page is not None and self._scroll_page is None:
+            writes.append((0x00, [
+                0x27, 0x00,                 # left horizontal scroll
+                scroll_page,                # start page
+                self.hw_scroll_interval,    # frames per step
+                scroll_page,                # end page
+                0x00, 0xff,
+                0x2f,                       # activate scroll
+            ]))
+            self._scroll_page = scroll_page
+
+        errors = getattr(self.bus, 'errors', 0)
+        self._write_blocks(writes)
+        if getattr(self.bus, 'errors', 0) != errors:
+            # a retried transfer may have left GDDRAM half written
+            self._sent = None
+            self.display_refresh_time = 0
+        elif sent is None or len(sent) != len(frame):
+            self._sent = bytearray(frame)
+        else:
+            sent[:] = frame
+        self._stale_pages.clear()
+        self.perf.observe('flush', time.perf_counter() - t)
+
+    def _window_cmds(self, col_start, col_end, page_start, page_end):
+        return (0x00, [
+            0x21, col_start, col_end,   # set column address
+            0x22, page_start, page_end, # set page address
+        ])
 
-        bs = [b for idx in range(self.line_num)
-              for b in self.buffer.get(idx, empty_line)]
+    def invalidate(self):
+        # force a full frame on next flush
+        self._bus_call(setattr, self, '_sent', None)
 
-        self._render_bytes(bs)
+    def _bus_call(self, func, *args):
+        # run a bus operation in order with the frames being flushed
+        if self.flusher and self.flusher.alive():
+            self.flusher.call(func, *args)
+        else:
+            func(*args)
 
-    def _render_bytes(self, bs):
-        blocks = chunks(bs, 32)
-        for block in blocks:
-            self.bus.write_i2c_block_data(0x3c, 0x40, block)
+    def _write_cmds(self, cmds):
+        self._write_blocks([(0x00, cmds)])
+
+    def _write_blocks(self, writes, bus=None):
+        if self.bus_lock:
+            with self.bus_lock:
+                self._write_blocks_locked(writes, bus)
+        else:
+            self._write_blocks_locked(writes, bus)
+
+    def _write_blocks_locked(self, writes, bus=None):
+        # writes is a list of (control byte, data) pairs, or of
+        # (None, buffer) with the control byte leading the buffer
+        bus = bus or self.bus
+        if self.use_rdwr:
+            # one i2c message per block, batched into as few ioctls
+            # as the kernel allows
+            msgs = []
+            for ctl, data in writes:
+                if ctl is None:
+                    # sent in place, no copy
+                    msgs.append(smbus.i2c_msg.from_buffer(self.addr, data))
+                else:
+                    msgs.append(smbus.i2c_msg.write(
+                        self.addr, bytes((ctl,)) + bytes(data)))
+            for batch in chunks(msgs, smbus.I2C_RDWR_IOCTL_MAX_MSGS):
+                bus.i2c_rdwr(*batch)
+                self.perf.count('ioctls')
+            self.perf.count('bytes', sum(len(msg) for msg in msgs))
+        else:
+            for ctl, data in writes:
+                if ctl is None:
+                    ctl, data = data[0], memoryview(data)[1:]
+                # buffers are copied into the ioctl buffer in one go
+                for block in chunks(data, smbus.I2C_SMBUS_BLOCK_MAX):
+                    bus.write_i2c_block_data(self.addr, ctl, block)
+                    self.perf.count('ioctls')
+                    self.perf.count('bytes', len(block) + 1)
 
     def clear_buffer(self):
-        self.buffer.clear()
+        self.buffer[:] = self._blank
+        self.hw_scroll_page = None
 
     def clear_lines(self):
         self.lines.clear()
 
     def display_off(self, force=False):
         if (not self.display_already_off) or force:
-            self.bus.write_i2c_block_data(0x3c, 0x00, [0xae])
+            self._bus_call(self._write_cmds, [0xae])
             self.gen_random_splash()
             self.display_already_off = True
 
     def display_on(self):
-        self.bus.write_i2c_block_data(0x3c, 0x00, [0xaf])
+        if self.display_already_off:
+            self._bus_call(self._write_cmds, [0xaf])
         self.display_already_off = False
 
+    def draw_splash(self):
+        image = self.splash_image
+        if image:
+            # centered
+            self.canvas.blit((self.width - image.width) // 2,
+                             (self.canvas.height - image.height) // 2, image)
+        else:
+            self.gen_random_splash()
+            self.canvas.bitmap(0, 0, self.splash, self.width)
+
     def gen_random_splash(self):
-        byte_num = int(128 * 64 / 8)
-        self.splash = [random.randrange(256) for i in range(byte_num)]
+        byte_num = len(self.buffer)
+        self.splash = bytes(random.randrange(256) for i in range(byte_num))
 
     def extend_display_off_time(self, timeout=None):
         if not timeout:
@@ -1,11 +1,12 @@
 import time
+from collections import deque
 
 from consts import SHUTDOWN, REBOOT, EXIT
 from oled import OLEDCtrl
 from scene import Scene
 import utils
 
-def prepare_ctrl():
+def prepare_ctrl(**ctrl_kwargs):
 
     # scene shutdown
     s_shutdown = Scene(_id=SHUTDOWN)
@@ -18,13 +19,14 @@ def prepare_ctrl():
 
     # scene 0
     def s0_draw(state, disp):
-        disp.gen_random_splash()
+        disp.draw_splash()
 
     s0 = Scene(draw_func=s0_draw, line_mode=False, refresh_interval=1)
 
     # scene 1
     def s1_init(state):
          state['counter'] = 0
+         state['loads'] = deque(maxlen=128)
 
 
     def s1_draw(state, disp):
@@ -59,6 +61,12 @@ def prepare_ctrl():
         disk_line = utils.get_disk_line()
         pl(disk_line)
 
+        # load history along the bottom page
+        loads = state['loads']
+        loads.append(utils.get_cpu_load())
+        y = disp.canvas.height - 8
+        disp.canvas.graph(0, y, disp.width, 8, loads, vmax=max(1.0, max(loads)))
+
     s1 = Scene(draw_func=s1_draw, init_func=s1_init, refresh_interval=0.5)
 
     # scene 2
@@ -144,7 +152,7 @@ def prepare_ctrl():
         (2, s2),
     )
 
-    ctrl = OLEDCtrl(init_scene=s0)
+    ctrl = OLEDCtrl(init_scene=s0, **ctrl_kwargs)
     return ctrl
 
 
@@ -6,7 +6,7 @@ from oled import OLEDCtrl
 from scene import Scene, MessageScene, KbInputScene, popme
 import utils
 
-def prepare_ctrl():
+def prepare_ctrl(**ctrl_kwargs):
 
     # scene shutdown
     s_shutdown = Scene(_id=SHUTDOWN)
@@ -19,7 +19,7 @@ def prepare_ctrl():
 
     # scene 0
     def s0_draw(state, disp):
-        disp.gen_random_splash()
+        disp.draw_splash()
 
     s0 = Scene(draw_func=s0_draw, line_mode=False, refresh_interval=1)
 
@@ -97,8 +97,9 @@ def prepare_ctrl():
 
             disp.putline(line, inverted=inverted, mode=mode)
 
+    # holding key 2 runs through the list
     s2 = Scene(init_func=s2_init, draw_func=s2_draw,
-               refresh_interval=0.3)
+               refresh_interval=0.3, repeat_keys=(2,))
 
     # scene 3
     def s3_init(state):
@@ -161,7 +162,7 @@ def prepare_ctrl():
 
             disp.putline(line, inverted=inverted, mode=mode)
 
-    s4 = Scene(init_func=s4_init, draw_func=s4_draw)
+    s4 = Scene(init_func=s4_init, draw_func=s4_draw, repeat_keys=(2,))
 
     # s0 keymap
     s0.add_keymap_entries(
@@ -302,7 +303,7 @@ def prepare_ctrl():
         (3, s3),
     )
 
-    ctrl = OLEDCtrl(init_scene=s0)
+    ctrl = OLEDCtrl(init_scene=s0, **ctrl_kwargs)
     return ctrl
 
 
@@ -1,3 +1,4 @@
+import inspect
 import time
 
 cmd_map = {}
@@ -13,6 +14,12 @@ cmd_map['addframe'] = addframe
 
 popme = ('pop', None)
 
+async def _resolve(res):
+    # scene callbacks may be plain functions or coroutine functions
+    if inspect.isawaitable(res):
+        res = await res
+    return res
+
 class Scene(object):
     _next_id = 0
 
@@ -22,7 +29,8 @@ class Scene(object):
 
     def __init__(self, _id=None,
                  draw_func=None, init_func=None, finish_func=None,
-                 keymap=None, key_func=None,
+                 keymap=None, key_func=None, long_keymap=None,
+                 repeat_keys=(),
                  clear=True, line_mode=True, flush=True, keep_state=False,
                  refresh_interval=0.1):
 
@@ -37,6 +45,10 @@ class Scene(object):
         self._finish_func = finish_func
         self._keymap = keymap if keymap else {}
         self._key_func = key_func
+        # keys with a long-press entry act on release or on long press,
+        # keys in repeat_keys act again and again while held
+        self._long_keymap = long_keymap if long_keymap else {}
+        self.repeat_keys = repeat_keys
 
         self.clear = clear
         self.line_mode = line_mode
@@ -73,19 +85,34 @@ class Scene(object):
             res = self._init_func(self._state)
             return self._process_result(res)
 
+    async def ainit(self, reset_frame=True):
+        if reset_frame:
+            self.frame = 0
+
+        if self._init_func:
+            if not self.keep_state:
+                self._state.clear()
+
+            res = await _resolve(self._init_func(self._state))
+            return self._process_result(res)
+
     def draw(self, display, inc_frame=1):
-        inc_frame_cmd = 'post_addframe'
-        inc_frame_cmdl = (inc_frame_cmd, inc_frame)
+        res = None
+        if self._draw_func:
+            res = self._draw_func(self._state, display)
+        return self._draw_result(res, inc_frame)
 
+    async def adraw(self, display, inc_frame=1):
+        res = None
         if self._draw_func:
+            res = await _resolve(self._draw_func(self._state, display))
+        return self._draw_result(res, inc_frame)
 
-            res = self._draw_func(self._state, display)
-        
-            if res:
-                new_scene, cmds = res
-            else:
-                res = (None, [inc_frame_cmdl])
-        else:
+    def _draw_result(self, res, inc_frame):
+        inc_frame_cmd = 'post_addframe'
+        inc_frame_cmdl = (inc_frame_cmd, inc_frame)
+
+        if not res:
             res = (None, [inc_frame_cmdl])
         return self._process_result(res)
 
@@ -94,6 +121,11 @@ class Scene(object):
             res = self._finish_func()
             return self._process_result(res)
 
+    async def afinish(self):
+        if self._finish_func:
+            res = await _resolve(self._finish_func())
+            return self._process_result(res)
+
     def add_keymap_entry(self, key, entry):
         self._keymap[key] = entry
 
@@ -101,6 +133,12 @@ class Scene(object):
         for key, entry in kes:
             self.add_keymap_entry(key, entry)
 
+    def add_long_keymap_entry(self, key, entry):
+        self._long_keymap[key] = entry
+
+    def has_long_key(self, key):
+        return key in self._long_keymap
+
     def handle_key(self, key):
         """handle key input/press
 
@@ -113,19 +151,39 @@ class Scene(object):
 
         if `self._key_func` exist, then use it first"""
 
+        res = self._key_result(key)
+        return self._process_result(res)
+
+    async def ahandle_key(self, key):
+        res = await _resolve(self._key_result(key))
+        return self._process_result(res)
+
+    def handle_long_key(self, key):
+        res = self._handler_result(self._long_keymap[key])
+        return self._process_result(res)
+
+    async def ahandle_long_key(self, key):
+        res = await _resolve(self._handler_result(self._long_keymap[key]))
+        return self._process_result(res)
+
+    def _key_result(self, key):
         if self._key_func:
             res = self._key_func(key, self._state)
 
         elif self._keymap:
-            handler = self._keymap[key]
-            try:
-                res = handler(self._state)
-            except TypeError as e:
-                res = (handler, [])
+            res = self._handler_result(self._keymap[key])
         else:
             res = (None, [])
 
-        return self._process_result(res)
+        return res
+
+    def _handler_result(self, handler):
+        # a keymap entry is a handler or the scene to switch to
+        try:
+            res = handler(self._state)
+        except TypeError as e:
+            res = (handler, [])
+        return res
 
     def handle_cmds(self, cmds):
         if cmds:
@@ -163,13 +221,13 @@ class MessageScene(Scene):
         def init_func(state):
             state['messages'] = messages
             if timeout:
-                state['end_time'] = time.time() + timeout
+                state['end_time'] = time.monotonic() + timeout
 
         def draw_func(state, disp):
             for message in messages:
                 disp.putline(message, mode=mode)
             end_time = state.get('end_time')
-            if end_time and time.time() > end_time:
+            if end_time and time.monotonic() > end_time:
                 return (popme, [])
 
         self._init_func = init_func
@@ -23,7 +23,7 @@
 import os
 import sys
 from fcntl import ioctl
-from ctypes import c_uint32, c_uint8, c_uint16, c_char, POINTER, Structure, Array, Union, create_string_buffer, string_at
+from ctypes import c_uint32, c_uint8, c_uint16, c_char, POINTER, Structure, Array, Union, create_string_buffer, string_at, addressof, memmove
 
 
 # Commands from uapi/linux/i2c-dev.h
@@ -48,6 +48,9 @@ I2C_SMBUS_BLOCK_PROC_CALL = 7  # Like I2C_SMBUS_BLOCK_DATA, it isn't supported b
 I2C_SMBUS_I2C_BLOCK_DATA = 8
 I2C_SMBUS_BLOCK_MAX = 32
 
+# Max number of i2c_msg per I2C_RDWR ioctl, from uapi/linux/i2c-dev.h
+I2C_RDWR_IOCTL_MAX_MSGS = 42
+
 # To determine what functionality is present (uapi/linux/i2c.h)
 try:
     from enum import IntFlag
@@ -228,6 +231,26 @@ class i2c_msg(Structure):
             addr=address, flags=0, len=len(arr),
             buf=arr)
 
+    @staticmethod
+    def from_buffer(address, buf):
+        """
+        Prepares an i2c write transaction that sends ``buf`` in place.
+
+        Unlike :py:meth:`write` nothing is copied: the message points into
+        ``buf``, so its content at the time of the transfer is sent.
+
+        :param address: Slave address.
+        :type address: int
+        :param buf: Bytes to write.
+        :type buf: writable buffer, e.g. bytearray or memoryview of one
+        :return: New :py:class:`i2c_msg` instance for write operation.
+        :rtype: :py:class:`i2c_msg`
+        """
+        arr = (c_char * len(buf)).from_buffer(buf)
+        return i2c_msg(
+            addr=address, flags=0, len=len(arr),
+            buf=arr)
+
 
 class i2c_rdwr_ioctl_data(Structure):
     """
@@ -245,7 +268,7 @@ class i2c_rdwr_ioctl_data(Structure):
         Factory method for creating a i2c_rdwr_ioctl_data struct that can
         be called with ``ioctl(fd, I2C_RDWR, data)``.
 
-        :param i2c_msg_instances: Up to 42 i2c_msg instances
+        :param i2c_msg_instances: Up to I2C_RDWR_IOCTL_MAX_MSGS i2c_msg instances
         :rtype: i2c_rdwr_ioctl_data
         """
         n_msg = len(i2c_msg_instances)
@@ -256,6 +279,34 @@ class i2c_rdwr_ioctl_data(Structure):
         )
 
 
+def _copy_to_block(union, data):
+    """
+    Copy a write payload into ``union.block`` behind its length byte.
+
+    ``bytes``, ``bytearray`` and ``memoryview`` payloads are copied with a
+    single memmove, other sequences element by element.
+
+    :param union: Target union.
+    :type union: union_i2c_smbus_data
+    :param data: Bytes to write.
+    :type data: bytes, bytearray, memoryview or list
+    """
+    length = len(data)
+    union.block[0] = length
+    if isinstance(data, bytes):
+        src = data
+    elif isinstance(data, (bytearray, memoryview)):
+        try:
+            src = (c_char * length).from_buffer(data)
+        except (TypeError, ValueError):
+            # read-only or non-contiguous buffer
+            src = bytes(data)
+    else:
+        union.block[1:length + 1] = data
+        return
+    memmove(addressof(union) + 1, src, length)
+
+
 #############################################################
 
 
@@ -275,6 +326,7 @@ class SMBus(object):
         """
         self.fd = None
         self.funcs = I2cFunc(0)
+        self._msgs = {}
         if bus is not None:
             self.open(bus)
         self.address = None
@@ -344,6 +396,35 @@ class SMBus(object):
         ioctl(self.fd, I2C_FUNCS, f)
         return f.value
 
+    def _get_msg(self, read_write, command, size):
+        """
+        Get the reusable ioctl message for a transfer size.
+
+        One message and data union is allocated per transfer size on first
+        use and then reused by every later call, so hot paths such as
+        :py:meth:`write_i2c_block_data` do not allocate ctypes objects.
+        The instance therefore must not be shared between threads
+        without locking.
+
+        :param read_write: I2C_SMBUS_READ or I2C_SMBUS_WRITE
+        :type read_write: int
+        :param command: Command/register byte
+        :type command: int
+        :param size: Transfer size identifier, e.g. I2C_SMBUS_BYTE_DATA
+        :type size: int
+        :return: Message and the data union it points to
+        :rtype: tuple
+        """
+        try:
+            msg, union = self._msgs[size]
+        except KeyError:
+            union = union_i2c_smbus_data()
+            msg = i2c_smbus_ioctl_data(size=size, data=union_pointer_type(union))
+            self._msgs[size] = (msg, union)
+        msg.read_write = read_write
+        msg.command = command
+        return msg, union
+
     def write_quick(self, i2c_addr, force=None):
         """
         Perform quick transaction. Throws IOError if unsuccessful.
@@ -353,7 +434,7 @@ class SMBus(object):
         :type force: Boolean
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=0, size=I2C_SMBUS_QUICK)
         ioctl(self.fd, I2C_SMBUS, msg)
 
@@ -369,11 +450,11 @@ class SMBus(object):
         :return: Read byte value
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_READ, command=0, size=I2C_SMBUS_BYTE
         )
         ioctl(self.fd, I2C_SMBUS, msg)
-        return msg.data.contents.byte
+        return union.byte
 
     def write_byte(self, i2c_addr, value, force=None):
         """
@@ -387,7 +468,7 @@ class SMBus(object):
         :type force: Boolean
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=value, size=I2C_SMBUS_BYTE
         )
         ioctl(self.fd, I2C_SMBUS, msg)
@@ -406,11 +487,11 @@ class SMBus(object):
         :rtype: int
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_READ, command=register, size=I2C_SMBUS_BYTE_DATA
         )
         ioctl(self.fd, I2C_SMBUS, msg)
-        return msg.data.contents.byte
+        return union.byte
 
     def write_byte_data(self, i2c_addr, register, value, force=None):
         """
@@ -427,10 +508,10 @@ class SMBus(object):
         :rtype: None
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_BYTE_DATA
         )
-        msg.data.contents.byte = value
+        union.byte = value
         ioctl(self.fd, I2C_SMBUS, msg)
 
     def read_word_data(self, i2c_addr, register, force=None):
@@ -447,11 +528,11 @@ class SMBus(object):
         :rtype: int
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_READ, command=register, size=I2C_SMBUS_WORD_DATA
         )
         ioctl(self.fd, I2C_SMBUS, msg)
-        return msg.data.contents.word
+        return union.word
 
     def write_word_data(self, i2c_addr, register, value, force=None):
         """
@@ -468,10 +549,10 @@ class SMBus(object):
         :rtype: None
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_WORD_DATA
         )
-        msg.data.contents.word = value
+        union.word = value
         ioctl(self.fd, I2C_SMBUS, msg)
 
     def process_call(self, i2c_addr, register, value, force=None):
@@ -489,12 +570,12 @@ class SMBus(object):
         :rtype: int
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_PROC_CALL
         )
-        msg.data.contents.word = value
+        union.word = value
         ioctl(self.fd, I2C_SMBUS, msg)
-        return msg.data.contents.word
+        return union.word
 
     def read_block_data(self, i2c_addr, register, force=None):
         """
@@ -510,12 +591,12 @@ class SMBus(object):
         :rtype: list
         """
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_READ, command=register, size=I2C_SMBUS_BLOCK_DATA
         )
         ioctl(self.fd, I2C_SMBUS, msg)
-        length = msg.data.contents.block[0]
-        return msg.data.contents.block[1:length + 1]
+        length = union.block[0]
+        return union.block[1:length + 1]
 
     def write_block_data(self, i2c_addr, register, data, force=None):
         """
@@ -526,7 +607,7 @@ class SMBus(object):
         :param register: Start register
         :type register: int
         :param data: List of bytes
-        :type data: list
+        :type data: list, bytes, bytearray or memoryview
         :param force:
         :type force: Boolean
         :rtype: None
@@ -535,11 +616,10 @@ class SMBus(object):
         if length > I2C_SMBUS_BLOCK_MAX:
             raise ValueError("Data length cannot exceed %d bytes" % I2C_SMBUS_BLOCK_MAX)
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_BLOCK_DATA
         )
-        msg.data.contents.block[0] = length
-        msg.data.contents.block[1:length + 1] = data
+        _copy_to_block(union, data)
         ioctl(self.fd, I2C_SMBUS, msg)
 
     def block_process_call(self, i2c_addr, register, data, force=None):
@@ -562,14 +642,13 @@ class SMBus(object):
         if length > I2C_SMBUS_BLOCK_MAX:
             raise ValueError("Data length cannot exceed %d bytes" % I2C_SMBUS_BLOCK_MAX)
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_BLOCK_PROC_CALL
         )
-        msg.data.contents.block[0] = length
-        msg.data.contents.block[1:length + 1] = data
+        _copy_to_block(union, data)
         ioctl(self.fd, I2C_SMBUS, msg)
-        length = msg.data.contents.block[0]
-        return msg.data.contents.block[1:length + 1]
+        length = union.block[0]
+        return union.block[1:length + 1]
 
     def read_i2c_block_data(self, i2c_addr, register, length, force=None):
         """
@@ -589,12 +668,12 @@ class SMBus(object):
         if length > I2C_SMBUS_BLOCK_MAX:
             raise ValueError("Desired block length over %d bytes" % I2C_SMBUS_BLOCK_MAX)
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_READ, command=register, size=I2C_SMBUS_I2C_BLOCK_DATA
         )
-        msg.data.contents.byte = length
+        union.byte = length
         ioctl(self.fd, I2C_SMBUS, msg)
-        return msg.data.contents.block[1:length + 1]
+        return union.block[1:length + 1]
 
     def write_i2c_block_data(self, i2c_addr, register, data, force=None):
         """
@@ -605,7 +684,7 @@ class SMBus(object):
         :param register: Start register
         :type register: int
         :param data: List of bytes
-        :type data: list
+        :type data: list, bytes, bytearray or memoryview
         :param force:
         :type force: Boolean
         :rtype: None
@@ -614,11 +693,10 @@ class SMBus(object):
         if length > I2C_SMBUS_BLOCK_MAX:
             raise ValueError("Data length cannot exceed %d bytes" % I2C_SMBUS_BLOCK_MAX)
         self._set_address(i2c_addr, force=force)
-        msg = i2c_smbus_ioctl_data.create(
+        msg, union = self._get_msg(
             read_write=I2C_SMBUS_WRITE, command=register, size=I2C_SMBUS_I2C_BLOCK_DATA
         )
-        msg.data.contents.block[0] = length
-        msg.data.contents.block[1:length + 1] = data
+        _copy_to_block(union, data)
         ioctl(self.fd, I2C_SMBUS, msg)
 
     def i2c_rdwr(self, *i2c_msgs):
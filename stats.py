@@ -0,0 +1,108 @@
+import json
+import time
+from collections import defaultdict
+
+
+class Histogram(object):
+    """Latency histogram with power-of-two microsecond buckets.
+
+    Bucket i counts samples below 2**i us, which is coarse but costs one
+    int.bit_length() per sample and stays the same size forever."""
+
+    bucket_num = 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * self.bucket_num
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+        idx = min(int(seconds * 1e6).bit_length(), self.bucket_num - 1)
+        self.buckets[idx] += 1
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile, in seconds
+        if not self.count:
+            return None
+
+        rank = self.count * p / 100.0
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min((1 << idx) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        mean = self.total / self.count if self.count else None
+        return {
+            'count': self.count,
+            'mean': mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class FrameStats(object):
+    """Counters and latency histograms for the render loop.
+
+    If `dump_path` is given, `maybe_dump` appends a JSON snapshot line to
+    it every `dump_interval` seconds. The snapshot comes from `snapshot`,
+    a callable, if one is passed, e.g. OLEDCtrl.stats."""
+
+    def __init__(self, dump_path=None, dump_interval=60.0):
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        self.histograms = defaultdict(Histogram)
+        self.start_time = time.time()
+        self.next_dump_time = self.start_time + self.dump_interval
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def observe(self, name, seconds):
+        self.histograms[name].add(seconds)
+
+    def snapshot(self):
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.start_time,
+            'counters': dict(self.counters),
+            'latency': {name: h.snapshot()
+                        for name, h in self.histograms.items()},
+        }
+
+    def maybe_dump(self, snapshot=None):
+        if not self.dump_path:
+            return
+
+        now = time.time()
+        if now < self.next_dump_time:
+            return
+
+        self.next_dump_time = now + self.dump_interval
+        self.dump(snapshot=snapshot)
+
+    def dump(self, path=None, extra=None, snapshot=None):
+        snap = snapshot() if snapshot else self.snapshot()
+        if extra:
+            snap.update(extra)
+
+        with open(path or self.dump_path, 'a') as f:
+            f.write(json.dumps(snap) + '\n')
@@ -0,0 +1,89 @@
+import time
+
+
+class ResilientBus(object):
+    """SMBus wrapper that rides out transient I2C errors.
+
+    A transfer failing with OSError is retried with bounded exponential
+    backoff. The first retry just repeats the transfer; later ones
+    reopen the bus fd through `opener` and call `on_reopen(bus)` with the
+    fresh raw bus, so the caller can replay the panel init sequence
+    before the transfer is tried again. The error only escapes once
+    every retry has failed.
+
+    `errors` counts failed attempts, so a caller can notice that a
+    transfer needed a retry and resend whatever it may have cut short."""
+
+    def __init__(self, opener, retries=4, backoff=0.002, max_backoff=0.1,
+                 on_reopen=None):
+        self.opener = opener
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_reopen = on_reopen
+
+        self.bus = opener()
+
+        self.errors = 0
+        self.reopens = 0
+        self.failures = 0
+        self.last_error = None
+
+    @property
+    def funcs(self):
+        return self.bus.funcs
+
+    def write_i2c_block_data(self, *args, **kwargs):
+        return self._call('write_i2c_block_data', args, kwargs)
+
+    def write_byte_data(self, *args, **kwargs):
+        return self._call('write_byte_data', args, kwargs)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        return self._call('i2c_rdwr', i2c_msgs, {})
+
+    def close(self):
+        self.bus.close()
+
+    def counters(self):
+        counters = {
+            'errors': self.errors,
+            'reopens': self.reopens,
+            'failures': self.failures,
+            'last_error': str(self.last_error) if self.last_error else None,
+        }
+        # pass through counters of the wrapped bus, e.g. the fake panel
+        if hasattr(self.bus, 'counters'):
+            counters.update(self.bus.counters())
+        return counters
+
+    def _call(self, name, args, kwargs):
+        delay = self.backoff
+        attempt = 0
+        while True:
+            try:
+                if attempt > 1:
+                    self._reopen()
+                return getattr(self.bus, name)(*args, **kwargs)
+
+            except OSError as e:
+                self.errors += 1
+                self.last_error = e
+                if attempt >= self.retries:
+                    self.failures += 1
+                    raise
+
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+            attempt += 1
+
+    def _reopen(self):
+        self.reopens += 1
+        try:
+            self.bus.close()
+        except OSError:
+            pass
+
+        self.bus = self.opener()
+        if self.on_reopen:
+            self.on_reopen(self.bus)
@@ -1,5 +1,10 @@
+import os
 import subprocess
 
+def get_cpu_load():
+    # 1 minute load average
+    return os.getloadavg()[0]
+
 def get_cpu_load_line():
     cmd = "top -bn1 | grep load | awk '{printf \"cpu load: %.2f\", $(NF-2)}'"
     out = subprocess.check_output(cmd, shell=True)
@@ -82,3 +87,19 @@ def run_cmd_with_timeout(cmd, timeout=None):
         return (-1, 'time out')
     except subprocess.CalledProcessError as e:
         return (e.returncode, 'cmd problem')
+
+async def run_cmd_async(cmd, timeout=None):
+    # same as run_cmd_with_timeout, but awaitable from async scenes
+    import asyncio
+    proc = await asyncio.create_subprocess_shell(
+        cmd, stdout=asyncio.subprocess.PIPE)
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return (-1, 'time out')
+
+    if proc.returncode:
+        return (proc.returncode, 'cmd problem')
+    return (0, out.decode('utf-8'))